@@ -0,0 +1,278 @@
+"""Post-run analysis of a sweep output file.
+
+Works on whole columns with NumPy, no per-row Python, so a 10M point .npy
+log takes a few seconds (CSV files are slower, parsing them dominates).
+For every measured column:
+
+- failed reads (NaN) and DMM overloads (+/-9.9E37) are counted and flagged
+- error vs. setpoint, absolute and relative
+- least-squares gain/offset fit of measured vs. set voltage; points more
+  than outlier_sigma robust sigmas (1.4826 * MAD, at least 1 nV) off the line are flagged
+  and the line is refit without them
+- INL: residual from the fitted line, also in % of the fitted span
+- DNL: step size between neighbouring setpoints relative to the fitted
+  step, minus 1 (0 is a perfect step), with the points sorted by setpoint
+
+The summary is written as JSON next to the data file, the per-point flags
+(FLAG_* bits, one uint8 field per measured column, in row order) as .npy:
+
+    python -m analysis diode.npy            # writes diode.summary.json and diode.flags.npy
+"""
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+import data_sinks
+
+# Per-point flag bits
+FLAG_NAN = 1 # Failed read, unparseable DMM response
+FLAG_OVERLOAD = 2 # DMM overload reading
+FLAG_OUTLIER = 4 # Residual beyond outlier_sigma robust sigmas
+
+# Keysight DMMs report an overload as +/-9.9E37
+OVERLOAD_LIMIT = 9.9e37
+
+# 1.4826 * MAD estimates the standard deviation of normally distributed residuals
+MAD_TO_SIGMA = 1.4826
+
+# Smallest residual sigma (V) used for outlier flagging, so float rounding on
+# noiseless data (e.g. the simulator) isn't flagged. Far below any DMM resolution.
+SIGMA_FLOOR = 1e-9
+
+
+@dataclass
+class ChannelAnalysis:
+    """Summary of one measured column. Error and INL figures are in the reading's unit."""
+    unit: str = "V"
+    points: int = 0
+    failed_reads: int = 0
+    overloads: int = 0
+    outliers: int = 0
+    gain: float = float('nan')
+    offset: float = float('nan')
+    error_mean: float = float('nan') # Measured - set
+    error_rms: float = float('nan')
+    error_max: float = float('nan') # Largest |measured - set|
+    rel_error_max: float = float('nan') # Largest |measured - set| / |set|, setpoints of 0 skipped
+    inl_max: float = float('nan') # Largest |residual| from the fitted line
+    inl_max_percent_fs: float = float('nan')
+    inl_max_index: int = -1 # Row of the worst residual
+    residual_rms: float = float('nan')
+    dnl_min: float = float('nan')
+    dnl_max: float = float('nan')
+    first_failed_index: int = -1
+    outlier_indices: list = field(default_factory=list) # First few flagged rows
+
+    @property
+    def clean(self):
+        return not (self.failed_reads or self.overloads or self.outliers)
+
+    def describe(self):
+        """One line for the run log."""
+        if np.isnan(self.gain):
+            # Held setpoint, offset is the mean reading
+            text = (f"mean {self.offset:.6g} {self.unit}, deviation {self.inl_max * 1000:.3f} m{self.unit} max, "
+                    f"{self.residual_rms * 1000:.3f} m{self.unit} rms")
+        else:
+            text = (f"gain {self.gain:.6g}, offset {self.offset * 1000:+.3f} m{self.unit}, "
+                    f"INL {self.inl_max * 1000:.3f} m{self.unit} ({self.inl_max_percent_fs:.3g}% FS)")
+        problems = []
+        if self.failed_reads:
+            problems.append(f"{self.failed_reads} failed reads (first at row {self.first_failed_index})")
+        if self.overloads:
+            problems.append(f"{self.overloads} overloads")
+        if self.outliers:
+            problems.append(f"{self.outliers} outliers")
+        if problems:
+            text += ", ⚠️ " + ", ".join(problems)
+        return text
+
+
+def analyze(v_set, v_read, outlier_sigma=6.0, max_listed=20, unit="V"):
+    """Analyze one column of readings against its setpoints.
+
+    Returns (ChannelAnalysis, flags), flags being a uint8 array of FLAG_* bits per point.
+    unit is the readings' unit, for current or resistance measurements.
+    """
+    v_set = np.asarray(v_set, dtype=np.float64)
+    v_read = np.asarray(v_read, dtype=np.float64)
+    result = ChannelAnalysis(unit=unit, points=len(v_read))
+    flags = np.zeros(len(v_read), dtype=np.uint8)
+
+    nan = np.isnan(v_read)
+    flags[nan] |= FLAG_NAN
+    overload = np.abs(v_read) >= OVERLOAD_LIMIT
+    flags[overload] |= FLAG_OVERLOAD
+    result.failed_reads = int(np.count_nonzero(nan))
+    result.overloads = int(np.count_nonzero(overload))
+    if result.failed_reads:
+        result.first_failed_index = int(np.argmax(nan))
+
+    valid = ~(nan | overload | np.isnan(v_set))
+    rows = np.flatnonzero(valid)
+    if not len(rows):
+        return result, flags
+    x = v_set[rows]
+    y = v_read[rows]
+
+    error = y - x
+    result.error_mean = float(error.mean())
+    result.error_rms = float(np.sqrt(np.mean(error * error)))
+    result.error_max = float(np.abs(error).max())
+    nonzero = x != 0
+    if nonzero.any():
+        result.rel_error_max = float(np.max(np.abs(error[nonzero] / x[nonzero])))
+    del error
+
+    # Fit, flag points far off the line, refit on the rest
+    gain, offset = _fit_line(x, y)
+    residual = y - _fit_or_mean(gain, offset, x)
+    deviation = np.abs(residual - np.median(residual))
+    sigma = max(MAD_TO_SIGMA * np.median(deviation), SIGMA_FLOOR)
+    outlier = deviation > outlier_sigma * sigma
+    if outlier.any():
+        flags[rows[outlier]] |= FLAG_OUTLIER
+        result.outliers = int(np.count_nonzero(outlier))
+        result.outlier_indices = rows[outlier][:max_listed].tolist()
+        keep = ~outlier
+        gain, offset = _fit_line(x[keep], y[keep])
+        residual = y - _fit_or_mean(gain, offset, x)
+    del deviation, outlier
+    result.gain = float(gain)
+    result.offset = float(offset)
+
+    abs_residual = np.abs(residual)
+    worst = int(np.argmax(abs_residual))
+    result.inl_max = float(abs_residual[worst])
+    result.inl_max_index = int(rows[worst])
+    result.residual_rms = float(np.sqrt(np.mean(residual * residual)))
+    span = abs(gain) * float(x.max() - x.min())
+    if span > 0:
+        result.inl_max_percent_fs = float(100 * result.inl_max / span)
+
+    # DNL needs the points in setpoint order (adaptive runs log in measurement order)
+    dx = np.diff(x)
+    if len(dx) and not (np.all(dx >= 0) or np.all(dx <= 0)):
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+        dx = np.diff(x)
+    step = gain * dx
+    moving = step != 0
+    if not np.isnan(gain) and moving.any():
+        dnl = np.diff(y)[moving] / step[moving] - 1
+        result.dnl_min = float(dnl.min())
+        result.dnl_max = float(dnl.max())
+    return result, flags
+
+
+def _fit_line(x, y):
+    """Least-squares gain and offset of y = gain * x + offset. Gain is NaN if x doesn't vary."""
+    y_mean = y.mean()
+    if x.min() == x.max():
+        # Held setpoint (soak log): no slope to fit, residuals are around the mean
+        return float('nan'), y_mean
+    x_mean = x.mean()
+    dx = x - x_mean
+    sxx = np.dot(dx, dx)
+    gain = np.dot(dx, y - y_mean) / sxx
+    return gain, y_mean - gain * x_mean
+
+
+def _fit_or_mean(gain, offset, x):
+    return offset if np.isnan(gain) else gain * x + offset
+
+
+def load_columns(path):
+    """Read the setpoint and measured columns of a sweep output file.
+
+    Returns (v_set, {label: v_read}); single channel files have the label "".
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        data = np.load(path, mmap_mode="r")
+        names = data.dtype.names
+        return data["v_set"], {_label(name): data[name] for name in names if name.startswith("v_read")}
+    if ext == ".parquet":
+        if data_sinks.pq is None:
+            raise RuntimeError("Reading .parquet files requires pyarrow: pip install pyarrow")
+        table = data_sinks.pq.read_table(path)
+        return (table.column("v_set").to_numpy(),
+                {_label(name): table.column(name).to_numpy() for name in table.column_names if name.startswith("v_read")})
+
+    with open(path) as f:
+        header = f.readline().strip().split(",")
+    # Column 0 is the ISO timestamp, the rest are numbers
+    columns = np.loadtxt(path, delimiter=",", skiprows=1, usecols=range(1, len(header)), ndmin=2, unpack=True)
+    measured = {}
+    for title, column in zip(header[1:], columns):
+        for quantity, unit in data_sinks.READING_TITLES.values():
+            if title == f"Measured {quantity} ({unit})":
+                measured[""] = column
+            elif title.startswith(f"Measured {quantity} ") and title.endswith(f" ({unit})"):
+                measured[title[len(f"Measured {quantity} "):-len(f" ({unit})")]] = column
+    return columns[0], measured
+
+
+def _label(name):
+    return name[len("v_read_"):]
+
+
+def summary_path(path):
+    return os.path.splitext(path)[0] + ".summary.json"
+
+
+def flags_path(path):
+    return os.path.splitext(path)[0] + ".flags.npy"
+
+
+def analyze_file(path, outlier_sigma=6.0, write_summary=True, unit="V"):
+    """Analyze every measured column of a sweep output file.
+
+    Returns {label: ChannelAnalysis} and, unless write_summary is False,
+    writes them to summary_path(path) and the per-point flags to
+    flags_path(path), with the reading column names of the data file
+    ("v_read", "v_read_<label>") as field names.
+    """
+    v_set, measured = load_columns(path)
+    results = {}
+    flags = np.zeros(len(v_set), dtype=[(f"v_read_{label}" if label else "v_read", np.uint8) for label in measured])
+    for label, v_read in measured.items():
+        results[label], flags[f"v_read_{label}" if label else "v_read"] = analyze(v_set, v_read, outlier_sigma, unit=unit)
+    if write_summary:
+        np.save(flags_path(path), flags)
+        with open(summary_path(path), "w") as f:
+            json.dump({
+                "data_file": os.path.basename(path),
+                "flags_file": os.path.basename(flags_path(path)),
+                "points": len(v_set),
+                "outlier_sigma": outlier_sigma,
+                "channels": {label: asdict(result) for label, result in results.items()},
+            }, f, indent=2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m analysis", description="Error, linearity and outlier summary of sweep output files.")
+    parser.add_argument("files", nargs="+", help=".csv, .npy or .parquet sweep output")
+    parser.add_argument("--outlier-sigma", type=float, default=6.0, help="flag residuals beyond this many robust sigmas")
+    parser.add_argument("--unit", default="V", help="unit of the readings, e.g. A or Ohm for current or resistance sweeps")
+    parser.add_argument("--no-summary", action="store_true", help="print only, don't write <file>.summary.json / <file>.flags.npy")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for path in args.files:
+        results = analyze_file(path, args.outlier_sigma, write_summary=not args.no_summary, unit=args.unit)
+        for label, result in results.items():
+            name = f"{path} {label}" if label else path
+            print(f"{name}: {result.points} points, {result.describe()}")
+            if not result.clean:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Batch runs: a parameter grid expanded into sweeps that run back to back.
+
+A batch spec (JSON, or YAML with PyYAML) has a base run spec and a grid of
+SweepConfig fields to vary. "ranges" is a list of [start, stop, step]:
+
+    {
+      "base": {"psu_address": "...", "dmm_address": "...", "output_file": "char/diode.npy", "settle_time": 0.05},
+      "grid": {"ranges": [[0, 2, 0.01], [0, 5, 0.1]], "current_limit": [0.01, 0.1],
+               "channel": [1, 2, 3], "high_impedance": [true, false]}
+    }
+
+Every combination becomes one job with its own output file. output_file
+may use {index} and any SweepConfig field, e.g. "diode_ch{channel}_{current_limit}A.npy";
+without placeholders "_<index>" is added to the name. All jobs share one
+session pool, so the instruments are opened once for the whole batch.
+
+Progress is kept in a state file next to the spec. Running the same spec
+again skips finished jobs and resumes an interrupted one at the first
+setpoint missing from its output file (.csv and .npy outputs). Jobs run
+with checkpoint set, so every point is on disk as soon as it is taken.
+
+    python -m batch batch.json [--restart] [--simulate]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from dataclasses import replace
+
+import session_pool
+import sweep_engine
+
+
+def expand_grid(base, grid):
+    """Return one run spec dict per combination of the grid values, base values filling the rest."""
+    keys = list(grid)
+    specs = []
+    for index, values in enumerate(itertools.product(*(grid[key] for key in keys))):
+        spec = dict(base)
+        for key, value in zip(keys, values):
+            if key == "ranges":
+                spec["start_voltage"], spec["stop_voltage"], spec["step_voltage"] = value
+            else:
+                spec[key] = value
+        spec["output_file"] = job_output_file(base.get("output_file", "measurements.csv"), index, spec)
+        specs.append(spec)
+    return specs
+
+
+def job_output_file(template, index, spec):
+    if "{" in template:
+        return template.format(index=index, **spec)
+    root, ext = os.path.splitext(template)
+    return f"{root}_{index:03d}{ext}"
+
+
+def batch_jobs(spec):
+    """Turn a batch spec dict into a list of validated SweepConfigs."""
+    unknown = set(spec) - {"base", "grid"}
+    if unknown:
+        raise ValueError(f"Unknown batch spec keys: {', '.join(sorted(unknown))}")
+    jobs = [sweep_engine.SweepConfig.from_dict(job) for job in expand_grid(spec.get("base", {}), spec.get("grid", {}))]
+    outputs = [data_output(job) for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Batch jobs would share output files, add {index} or grid fields to output_file")
+    for job in jobs:
+        job.validate()
+    return jobs
+
+
+def data_output(config):
+    return os.path.abspath(sweep_engine.data_sinks.output_path(config.output_file))
+
+
+class BatchState:
+    """On-disk job status ("pending", "running", "done", "failed"), rewritten atomically on every change."""
+
+    def __init__(self, path, jobs):
+        self.path = path
+        self.outputs = [data_output(job) for job in jobs]
+        self.status = ["pending"] * len(jobs)
+
+    def load(self):
+        """Pick up the status of a previous run of the same batch. Returns False if there is none."""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("outputs") != self.outputs:
+            return False # Different grid, start over
+        self.status = saved["status"]
+        return True
+
+    def set(self, index, status):
+        self.status[index] = status
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"outputs": self.outputs, "status": self.status}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class BatchRun:
+    """Run a list of SweepConfigs one after another on a shared session pool.
+
+    on_job(index, count, config) is called before each job starts; log and
+    on_sample are passed to every SweepRun. stop() ends the current job at
+    the next setpoint and skips the rest; its state stays "running" so the
+    next run resumes it.
+    """
+
+    def __init__(self, jobs, rm, state_path, log=print, on_job=sweep_engine._noop,
+                 on_sample=sweep_engine._noop, on_status=sweep_engine._noop, pool=None, restart=False):
+        self.jobs = jobs
+        self.rm = rm
+        self.log = log
+        self.on_job = on_job
+        self.on_sample = on_sample
+        self.on_status = on_status
+        self.pool = pool if pool is not None else session_pool.SessionPool(rm, on_open=sweep_engine.clear_instrument_errors)
+        self._own_pool = pool is None
+        self.state = BatchState(state_path, jobs)
+        self.restart = restart
+        self.active_run = None
+        self.is_running = False
+
+    @property
+    def started_at(self):
+        """started_at of the running job, for progress estimates."""
+        return self.active_run.started_at if self.active_run else None
+
+    @property
+    def resumed_from(self):
+        return self.active_run.resumed_from if self.active_run else 0
+
+    def stop(self):
+        self.is_running = False
+        if self.active_run:
+            self.active_run.stop()
+
+    def force_cleanup(self):
+        if self.active_run:
+            self.active_run.force_cleanup()
+
+    def run(self):
+        """Run every unfinished job. Returns the number of jobs that are done."""
+        self.is_running = True
+        if not self.restart and self.state.load():
+            self.log(f"Continuing batch: {self.state.status.count('done')} of {len(self.jobs)} jobs already done")
+        try:
+            for index, config in enumerate(self.jobs):
+                if not self.is_running:
+                    break
+                status = self.state.status[index]
+                if status == "done":
+                    continue
+                # An interrupted job carries on from its output file; anything else starts clean
+                resumable = config.resumable()
+                config = replace(config, resume=status == "running" and resumable, checkpoint=resumable)
+                self.log(f"Batch job {index + 1}/{len(self.jobs)}: {describe(config)}")
+                self.on_job(index, len(self.jobs), config)
+                self.state.set(index, "running")
+
+                self.active_run = sweep_engine.create_run(
+                    config, self.rm,
+                    log=self.log,
+                    on_sample=self.on_sample,
+                    on_status=self.on_status,
+                    pool=self.pool,
+                )
+                try:
+                    result = self.active_run.run()
+                except Exception as e:
+                    self.log(f"Batch job {index + 1} failed: {e}")
+                    self.state.set(index, "failed")
+                    continue
+                if result.stopped:
+                    break # Stays "running", resumed next time
+                self.state.set(index, "done" if result.stats.ok else "failed")
+        finally:
+            self.active_run = None
+            self.is_running = False
+            if self._own_pool:
+                self.pool.close_all()
+        done = self.state.status.count("done")
+        self.log(f"Batch finished: {done} of {len(self.jobs)} jobs done")
+        return done
+
+
+def describe(config):
+    """One line summary of what a batch job varies."""
+    channels = f"{len(config.channels)} channels" if config.channels else f"CH{config.channel}"
+    if config.measurement == "volt_dc":
+        measurement = f"High-Z {'on' if config.high_impedance else 'off'}"
+    else:
+        measurement = config.measurement
+    return (f"{config.voltages().describe()}, "
+            f"{config.current_limit:g} A, {channels}, {measurement} "
+            f"-> {config.output_file}")
+
+
+def default_state_path(spec_path):
+    return os.path.splitext(spec_path)[0] + ".state.json"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m batch", description="Run a grid of PSU/DMM sweeps back to back.")
+    parser.add_argument("spec", help="batch spec (.json, .yaml or .yml) with base and grid")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved progress and run every job again")
+    parser.add_argument("--backend", default="", help="pyvisa backend, e.g. @py")
+    parser.add_argument("--simulate", action="store_true", help="run against the simulated PSU/DMM in sim_backend")
+    args = parser.parse_args(argv)
+
+    spec = sweep_engine.load_spec(args.spec)
+    if args.simulate:
+        import sim_backend
+        base = spec.setdefault("base", {})
+        if base.get("channels"):
+            base["channels"], rm = sim_backend.simulated_rack(base["channels"])
+        else:
+            base["psu_address"] = sim_backend.SIM_PSU_ADDRESS
+            base["dmm_address"] = sim_backend.SIM_DMM_ADDRESS
+            rm = sim_backend.SimResourceManager()
+    else:
+        import pyvisa # Only needed when actually talking to instruments
+        rm = pyvisa.ResourceManager(args.backend)
+    jobs = batch_jobs(spec)
+
+    for job in jobs:
+        os.makedirs(os.path.dirname(data_output(job)), exist_ok=True)
+
+    def on_job(index, count, config):
+        print(f"=== Job {index + 1}/{count} ===")
+
+    batch = BatchRun(jobs, rm, default_state_path(args.spec), restart=args.restart, on_job=on_job)
+    try:
+        done = batch.run()
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume")
+        return 130
+    return 0 if done == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Post-run analysis time on a large synthetic sweep log.
+
+Writes a noisy, slightly nonlinear sweep with a few failed reads, overloads
+and glitches to a temporary .npy (and optionally .csv) file and times
+analysis.analyze_file on it.
+
+Run from the repository root:
+    python -m benchmarks.bench_analysis --points 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import analysis
+import data_sinks
+
+
+def make_log(path, points, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(points, dtype=data_sinks.SAMPLE_DTYPE)
+    rows["v_set"] = np.linspace(0.0, 10.0, points)
+    rows["v_read"] = 0.5 * rows["v_set"] + 0.001 + 1e-4 * np.sin(rows["v_set"]) + rng.normal(0, 1e-5, points)
+    bad = rng.choice(points, size=30, replace=False)
+    rows["v_read"][bad[:10]] = np.nan
+    rows["v_read"][bad[10:20]] = 9.9e37
+    rows["v_read"][bad[20:]] += 0.01
+    if path.endswith(".csv"):
+        with data_sinks.open_sink(path) as sink:
+            sink.write_batch(rows)
+    else:
+        np.save(path, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=10_000_000)
+    parser.add_argument("--csv", action="store_true", help="also time a .csv log (slow to write and parse)")
+    args = parser.parse_args()
+
+    formats = [".npy", ".csv"] if args.csv else [".npy"]
+    with tempfile.TemporaryDirectory() as out_dir:
+        for ext in formats:
+            path = os.path.join(out_dir, f"soak{ext}")
+            make_log(path, args.points)
+            start = time.perf_counter()
+            result = analysis.analyze_file(path)[""]
+            elapsed = time.perf_counter() - start
+            print(f"{ext:<5} {args.points} points: {elapsed:6.2f} s ({args.points / elapsed / 1e6:.1f} M points/s)")
+            print(f"      {result.describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Serial vs. concurrent sweep loop on the simulated PSU/DMM pair.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrent_io
+"""
+import argparse
+import csv
+import io
+import time
+
+import sim_backend
+import sweep_engine
+
+
+def run_once(run_sweep, args):
+    rm = sim_backend.SimResourceManager(latency={"READ?": args.dmm_latency, "default": args.psu_latency})
+    psu = rm.open_resource(sim_backend.SIM_PSU_ADDRESS)
+    dmm = rm.open_resource(sim_backend.SIM_DMM_ADDRESS)
+    psu.write("OUTP ON")
+    voltages = [i * 0.01 for i in range(args.points)]
+    out = csv.writer(io.StringIO())
+
+    def on_step(idx, v_set, v_read, t_ns, settle_s):
+        out.writerow([t_ns, v_set, v_read, settle_s])
+        time.sleep(args.bookkeeping) # Stand-in for disk and UI work
+
+    start = time.perf_counter()
+    stats = run_sweep(psu, dmm, voltages, args.settle, on_step, lambda: True, print,
+                      error_check_interval=args.error_interval)
+    elapsed = time.perf_counter() - start
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--settle", type=float, default=0.0, help="settle time per step (s)")
+    parser.add_argument("--psu-latency", type=float, default=0.004, help="PSU write/query latency (s)")
+    parser.add_argument("--dmm-latency", type=float, default=0.010, help="DMM READ? latency (s)")
+    parser.add_argument("--bookkeeping", type=float, default=0.003, help="per-step CSV/UI time (s)")
+    parser.add_argument("--error-interval", type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"{args.points} points, settle {args.settle * 1000:.1f} ms, PSU {args.psu_latency * 1000:.1f} ms, "
+          f"DMM {args.dmm_latency * 1000:.1f} ms, bookkeeping {args.bookkeeping * 1000:.1f} ms")
+    results = {}
+    for name, run_sweep in (("serial", sweep_engine.run_serial_sweep),
+                            ("concurrent", sweep_engine.run_concurrent_sweep)):
+        elapsed, stats = run_once(run_sweep, args)
+        results[name] = elapsed
+        print(f"  {name:<11} {elapsed:7.3f} s  {stats.steps_done / elapsed:8.1f} steps/s  "
+              f"overhead {stats.overhead_per_step * 1000:6.2f} ms/step")
+    print(f"  speedup     {results['serial'] / results['concurrent']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""ASCII vs. binary block parsing of bulk DMM readings.
+
+Run from the repository root:
+    python -m benchmarks.bench_reading_parse
+"""
+import argparse
+import time
+
+import numpy as np
+from pyvisa import util
+
+import sweep_engine
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    values = np.random.default_rng(0).normal(1.0, 1e-3, args.readings)
+    ascii_payload = ",".join(f"{v:+.9E}" for v in values) + "\n"
+    data = values.astype(">f8").tobytes()
+    length = str(len(data))
+    binary_payload = f"#{len(length)}{length}".encode() + data + b"\n"
+    out = np.empty(args.readings)
+    reading_buffer = sweep_engine.ReadingBuffer(args.readings)
+
+    cases = [
+        ("ASCII, float() per value", len(ascii_payload),
+         lambda: [float(x) for x in ascii_payload.split(",")]),
+        ("ASCII, np.fromstring", len(ascii_payload),
+         lambda: sweep_engine.parse_readings(ascii_payload)),
+        ("REAL,64, pyvisa from_ieee_block", len(binary_payload),
+         lambda: util.from_ieee_block(binary_payload, "d", True, np.array)),
+        ("REAL,64, from_ieee_block into ReadingBuffer", len(binary_payload),
+         lambda: reading_buffer.store(util.from_ieee_block(binary_payload, "d", True, np.array))),
+        ("REAL,64, parse_binary_block", len(binary_payload),
+         lambda: sweep_engine.parse_binary_block(binary_payload)),
+        ("REAL,64, parse_binary_block(out=)", len(binary_payload),
+         lambda: sweep_engine.parse_binary_block(binary_payload, out)),
+    ]
+
+    assert np.allclose(sweep_engine.parse_readings(ascii_payload), values)
+    assert np.array_equal(sweep_engine.parse_binary_block(binary_payload), values)
+
+    print(f"{args.readings} readings, best of {args.repeat}")
+    for name, size, func in cases:
+        elapsed = best_of(args.repeat, func)
+        print(f"  {name:<44} {elapsed * 1000:9.3f} ms  {size / 1e6:6.2f} MB on the wire  "
+              f"{args.readings / elapsed / 1e6:8.2f} M readings/s")
+
+
+if __name__ == "__main__":
+    main()
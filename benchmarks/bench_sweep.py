@@ -0,0 +1,99 @@
+"""End-to-end sweep throughput on the simulated PSU/DMM pair.
+
+Runs SweepRun (connect, configure, sweep, output writer) for each point
+count and sweep mode and reports steps/s, where each step's time went
+(PSU transfers, DMM transfers, host-side work) and peak Python memory.
+
+Run from the repository root:
+    python -m benchmarks.bench_sweep
+    python -m benchmarks.bench_sweep --sizes 10,1000,1000000 --modes stepped --latency default=0.0005
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import sim_backend
+import sweep_engine
+
+
+def parse_latency(text):
+    """'READ?=0.01,default=0.001' -> {'READ?': 0.01, 'default': 0.001}"""
+    latency = {}
+    for item in filter(None, text.split(",")):
+        header, _, seconds = item.partition("=")
+        latency[header.strip()] = float(seconds)
+    return latency
+
+
+class BenchRun(sweep_engine.SweepRun):
+    def _list_measure_window(self):
+        # The simulated DMM reads instantly, keep list steps as short as the host allows
+        return self.config.list_measure_window
+
+
+def run_case(points, mode, args, out_dir):
+    rm = sim_backend.SimResourceManager(latency=parse_latency(args.latency))
+    config = sweep_engine.SweepConfig(
+        psu_address=sim_backend.SIM_PSU_ADDRESS,
+        dmm_address=sim_backend.SIM_DMM_ADDRESS,
+        output_file=os.path.join(out_dir, f"bench_{mode}_{points}{args.format}"),
+        start_voltage=0.0,
+        stop_voltage=points - 1, # 1 V steps, so the point count is exact
+        step_voltage=1.0,
+        settle_time=0.0,
+        sweep_mode=mode,
+        list_measure_window=0.0,
+        trace_commands=args.trace,
+        analyze=False, # Timed separately by bench_analysis
+    )
+
+    if args.memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = BenchRun(config, rm, log=lambda message: None).run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+    if args.memory:
+        tracemalloc.stop()
+
+    steps = result.stats.steps_done
+    psu_busy = sum(s.busy_time for s in rm.opened if isinstance(s, sim_backend.SimPsu))
+    dmm_busy = sum(s.busy_time for s in rm.opened if isinstance(s, sim_backend.SimDmm))
+    return {
+        "steps": steps,
+        "elapsed": elapsed,
+        "psu": psu_busy / steps,
+        "dmm": dmm_busy / steps,
+        # Transfers overlap in concurrent mode, so host time can't be a plain difference there
+        "host": max(0.0, elapsed - psu_busy - dmm_busy) / steps,
+        "peak": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000,1000000", help="comma separated point counts")
+    parser.add_argument("--modes", default="stepped,concurrent,list", help="comma separated sweep modes")
+    parser.add_argument("--latency", default="", help="simulated latency per SCPI header, e.g. READ?=0.01,default=0.001")
+    parser.add_argument("--format", default=".npy", choices=(".csv", ".npy"), help="output file type")
+    parser.add_argument("--no-trace", dest="trace", action="store_false", help="turn off per-command VISA timing")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc (it slows the run)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    modes = args.modes.split(",")
+    print(f"latency: {args.latency or 'none'}, output: {args.format}, command trace: {'on' if args.trace else 'off'}")
+    print(f"{'mode':<11}{'points':>9}{'time s':>10}{'steps/s':>12}{'psu us':>9}{'dmm us':>9}{'host us':>9}{'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as out_dir:
+        for mode in modes:
+            for points in sizes:
+                r = run_case(points, mode, args, out_dir)
+                print(f"{mode:<11}{r['steps']:>9}{r['elapsed']:>10.3f}{r['steps'] / r['elapsed']:>12.0f}"
+                      f"{r['psu'] * 1e6:>9.1f}{r['dmm'] * 1e6:>9.1f}{r['host'] * 1e6:>9.1f}"
+                      f"{r['peak'] / 1e6 if args.memory else float('nan'):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Continuous logging: hold the PSU at one voltage and sample at a fixed rate.
+
+For soak and stability tests. Each sample reads the DMM and, with log_psu,
+the PSU's own voltage/current readback (MEAS:VOLT?/MEAS:CURR? on most
+supplies, see drivers.PsuProfile) in parallel. Samples are
+scheduled on absolute monotonic deadlines (start + n * period), so time
+spent measuring never accumulates into drift. A sample that finishes after
+the next deadline has passed skips the deadlines it missed rather than
+bursting to catch up; they are counted in LogStats.missed. Rows go through
+the bounded output ring and can be split into numbered files by size or
+age, so memory stays flat however long the run is. Built from a SweepConfig
+with sweep_mode "continuous", usually through sweep_engine.create_run().
+"""
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import data_sinks
+import visa_trace
+from sweep_engine import (SweepResult, SweepRun, SweepStats, _wait_interruptible, enable_error_status,
+                          parse_reading, poll_instrument_errors, timestamp_ns)
+
+# Longest single sleep while waiting for a deadline, so stop() is noticed quickly at low rates
+MAX_SLEEP = 0.2
+
+
+@dataclass
+class LogStats(SweepStats):
+    """SweepStats plus the scheduling figures of a continuous log."""
+    missed: int = 0 # Deadlines skipped because a sample overran its period
+    max_lag: float = 0.0 # Worst sample start delay against its deadline (s)
+    lag_total: float = 0.0
+
+
+def run_continuous_log(measure, period, on_sample, should_continue, log, duration=0.0,
+                       psu_measure=None, psu_check=None, dmm_check=None, error_check_interval=25):
+    """Call measure() every period seconds until duration has passed or should_continue() is False.
+
+    on_sample(idx, v_read, psu_v, psu_i, t_ns, lag_s): psu_v/psu_i are NaN
+    without psu_measure, lag_s is how late the sample started. psu_measure()
+    returns (volts, amps) and runs on its own I/O thread alongside measure();
+    psu_check() polls the PSU errors every error_check_interval samples on
+    the same thread and stops the log if it returns False. dmm_check() does
+    the same for the DMM, on the calling thread once the reading is in.
+    """
+    stats = LogStats()
+    period_ns = int(period * 1e9)
+    start_ns = time.monotonic_ns()
+    end_ns = start_ns + int(duration * 1e9) if duration > 0 else None
+    nan_pair = (math.nan, math.nan)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="psu-io") as psu_io:
+        slot = 0 # Deadline number of the next sample
+        idx = 0
+        while should_continue():
+            deadline = start_ns + slot * period_ns
+            if end_ns is not None and deadline >= end_ns:
+                break
+
+            # Sleep in short slices up to the deadline so a stop request isn't held up
+            now = time.monotonic_ns()
+            while now < deadline and should_continue():
+                time.sleep(min((deadline - now) / 1e9, MAX_SLEEP))
+                now = time.monotonic_ns()
+            if now < deadline:
+                break
+            lag = (now - deadline) / 1e9
+
+            pending_psu = psu_io.submit(psu_measure) if psu_measure else None
+            pending_err = None
+            if psu_check and (idx + 1) % error_check_interval == 0:
+                pending_err = psu_io.submit(psu_check)
+            v_read = measure()
+            t_ns = timestamp_ns()
+            psu_v, psu_i = pending_psu.result() if pending_psu else nan_pair
+            if pending_err is not None and not pending_err.result():
+                log(f"⚠️ Stopping due to PSU error after sample {idx + 1}")
+                stats.ok = False
+                break
+            if dmm_check and (idx + 1) % error_check_interval == 0 and not dmm_check():
+                log(f"⚠️ Stopping due to DMM error after sample {idx + 1}")
+                stats.ok = False
+                break
+
+            on_sample(idx, v_read, psu_v, psu_i, t_ns, lag)
+
+            stats.steps_done += 1
+            stats.overhead_total += (time.monotonic_ns() - now) / 1e9
+            stats.lag_total += lag
+            stats.max_lag = max(stats.max_lag, lag)
+            idx += 1
+
+            # Next deadline still ahead of us; any in between were missed
+            slot += 1
+            behind = (time.monotonic_ns() - start_ns) // period_ns + 1
+            if behind > slot:
+                stats.missed += behind - slot
+                slot = behind
+
+    return stats
+
+
+class ContinuousRun(SweepRun):
+    """SweepRun that holds start_voltage and logs at config.sample_rate instead of sweeping."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.files = []
+
+    def run(self):
+        cfg = self.config
+        cfg.validate()
+        self.is_running = True
+        result = SweepResult(output_file=data_sinks.output_path(cfg.output_file))
+        self.trace = result.trace = visa_trace.CommandTrace() if cfg.trace_commands else None
+        failed = False
+        try:
+            self._connect()
+            if not self._configure():
+                result.stats.ok = False
+                return result
+            enable_error_status(self.dmm) # Polled during the log like the PSU
+
+            rotating = cfg.rotate_mb > 0 or cfg.rotate_hours > 0
+            if rotating:
+                sink_target = data_sinks.RotatingSink(
+                    result.output_file,
+                    max_bytes=int(cfg.rotate_mb * 1e6),
+                    max_seconds=cfg.rotate_hours * 3600,
+                    on_rotate=lambda path: self.log(f"Logging to {path}"),
+                    dtype=data_sinks.LOG_DTYPE,
+                    measurement=cfg.measurement,
+                )
+                self.files = sink_target.files
+            else:
+                sink_target = data_sinks.open_sink(result.output_file, dtype=data_sinks.LOG_DTYPE,
+                                                   measurement=cfg.measurement)
+                self.files = [result.output_file]
+            sink = data_sinks.AsyncSinkWriter(sink_target, capacity=cfg.writer_queue_size, policy=cfg.writer_policy,
+                                              log=self.log)
+
+            with sink:
+                self._output_on()
+                self.on_status(f"Status: Holding {cfg.start_voltage:.3f}V, settling...")
+                if not _wait_interruptible(cfg.settle_time, lambda: self.is_running):
+                    result.stopped = True
+                    return result
+
+                self.started_at = time.time()
+                period = 1.0 / cfg.sample_rate
+                total = int(cfg.duration * cfg.sample_rate) if cfg.duration > 0 else 0
+                v_hold = cfg.start_voltage
+                self.log(f"Logging every {period * 1000:g} ms "
+                         + (f"for {cfg.duration:g} s" if total else "until stopped"))
+                self.on_status(f"Status: Logging at {v_hold:.3f}V")
+
+                def on_sample(idx, v_read, psu_v, psu_i, t_ns, lag):
+                    sink.append(t_ns, v_hold, v_read, psu_v, psu_i, lag)
+                    # lag_s takes the place of the settle time in the sweep callback
+                    self.on_sample(idx, total, v_hold, v_read, t_ns, lag)
+
+                psu, dmm = self.psu, self.dmm
+                profile = self.psu_profile
+                sweep_start_ns = time.monotonic_ns()
+                result.stats = run_continuous_log(
+                    self._dmm_reader(self.dmm, self.dmm_profile, self.binary),
+                    period,
+                    on_sample,
+                    should_continue=lambda: self.is_running,
+                    log=self.log,
+                    duration=cfg.duration,
+                    psu_measure=(lambda: (parse_reading(psu.query(profile.measure_voltage)),
+                                          parse_reading(psu.query(profile.measure_current)))) if cfg.log_psu else None,
+                    psu_check=lambda: poll_instrument_errors(psu, "PSU", self.log),
+                    dmm_check=lambda: poll_instrument_errors(dmm, "DMM", self.log),
+                    error_check_interval=cfg.error_check_interval,
+                )
+                result.stopped = not self.is_running
+                if self.trace:
+                    self.trace.add_span("Log", sweep_start_ns, time.monotonic_ns())
+
+            stats = result.stats
+            result.duration = time.time() - self.started_at
+            result.writer_max_depth = sink.max_depth
+            result.writer_dropped = sink.dropped
+            d_mins, d_secs = divmod(int(result.duration), 60)
+            self.log(f"Logging Complete. {stats.steps_done} samples in {d_mins:02d}:{d_secs:02d}")
+            if stats.steps_done:
+                self.log(f"Schedule: {stats.missed} missed deadlines, sample lag avg "
+                         f"{stats.lag_total / stats.steps_done * 1000:.2f} ms, max {stats.max_lag * 1000:.2f} ms")
+            writer_msg = f"Output writer: peak queue depth {sink.max_depth}/{sink.capacity}"
+            if sink.dropped:
+                writer_msg += f", ⚠️ {sink.dropped} rows dropped"
+            self.log(writer_msg)
+            if rotating:
+                self.log(f"{len(self.files)} output files: {self.files[0]} ... {self.files[-1]}")
+            if self.trace:
+                self._report_trace()
+            if cfg.analyze and stats.steps_done:
+                self.force_cleanup() # Output off first
+                result.analysis = {}
+                for path in self.files:
+                    for label, channel in (self._analyze(path) or {}).items():
+                        result.analysis[os.path.basename(path) if rotating else label] = channel
+            return result
+
+        except Exception:
+            failed = True
+            raise
+
+        finally:
+            self._finish(failed)
@@ -0,0 +1,469 @@
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet output is optional
+    pa = None
+    pq = None
+
+# One row per measurement point, timestamps are epoch ns (see sweep_engine.timestamp_ns)
+# and settle_s is the settle time actually used for the point
+SAMPLE_DTYPE = np.dtype([("t_ns", "<i8"), ("v_set", "<f8"), ("v_read", "<f8"), ("settle_s", "<f8")])
+
+CSV_HEADER = ["Timestamp", "Set Voltage (V)", "Measured Voltage (V)", "Settle Time (s)"]
+
+# Reading column titles per measurement function (drivers.MEASUREMENTS): (quantity, unit)
+READING_TITLES = {
+    "volt_dc": ("Voltage", "V"),
+    "curr_dc": ("Current", "A"),
+    "res_2w": ("Resistance", "Ohm"),
+    "res_4w": ("4-Wire Resistance", "Ohm"),
+}
+
+
+def sample_dtype(channel_labels=None):
+    """Row layout for a sweep. Multi-channel runs get one v_read_<label> column per channel."""
+    if not channel_labels:
+        return SAMPLE_DTYPE
+    return np.dtype([("t_ns", "<i8"), ("v_set", "<f8")]
+                    + [(f"v_read_{label}", "<f8") for label in channel_labels]
+                    + [("settle_s", "<f8")])
+
+
+# Continuous logging rows: the held setpoint, the DMM reading, the PSU's own readback
+# and how late the sample started against its schedule
+LOG_DTYPE = np.dtype([("t_ns", "<i8"), ("v_set", "<f8"), ("v_read", "<f8"),
+                      ("psu_v", "<f8"), ("psu_i", "<f8"), ("lag_s", "<f8")])
+
+LOG_CSV_TITLES = {"psu_v": "PSU Voltage (V)", "psu_i": "PSU Current (A)", "lag_s": "Sample Lag (s)"}
+
+
+def csv_header(dtype, measurement="volt_dc"):
+    quantity, unit = READING_TITLES[measurement]
+    titles = dict(zip(SAMPLE_DTYPE.names, CSV_HEADER), **LOG_CSV_TITLES)
+    titles["v_read"] = f"Measured {quantity} ({unit})"
+    return [titles.get(name) or f"Measured {quantity} {name[len('v_read_'):]} ({unit})" for name in dtype.names]
+
+
+class DataSink:
+    """Base class for sweep output.
+
+    Rows (SAMPLE_DTYPE by default, see sample_dtype) are collected in a
+    preallocated structured array and handed to _write_batch() when
+    batch_size rows are buffered or flush_interval seconds have passed, so
+    disk I/O happens once per batch instead of once per row. Subclasses
+    implement _open(), _write_batch(batch) and _close().
+
+    With resume=True an existing file is kept and appended to; rows_written
+    starts at the number of complete rows already in it (a row cut off by a
+    crash is dropped). A missing file is created as usual.
+
+    measurement (a READING_TITLES key) only changes the CSV column titles,
+    the reading columns are named v_read whatever the DMM measures.
+    """
+    extension = ""
+    resumable = False # _reopen() implemented
+
+    def __init__(self, path, batch_size=1024, flush_interval=1.0, dtype=SAMPLE_DTYPE, resume=False,
+                 measurement="volt_dc"):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dtype = dtype
+        self.resume = resume
+        self.measurement = measurement
+        self.rows_written = 0
+        self._buffer = np.empty(batch_size, dtype=dtype)
+        self._count = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if self.resume and os.path.exists(self.path):
+            self._reopen()
+        else:
+            self._open()
+
+    def append(self, *row):
+        """Buffer one row, fields in dtype order (t_ns, v_set, v_read..., settle_s)."""
+        self._buffer[self._count] = row
+        self._count += 1
+        if self._count == self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_batch(self, batch):
+        """Write an array of rows straight through, after anything already buffered."""
+        self.flush()
+        if len(batch):
+            self._write_batch(batch)
+            self.rows_written += len(batch)
+
+    def flush(self):
+        if self._count:
+            self._write_batch(self._buffer[:self._count])
+            self.rows_written += self._count
+            self._count = 0
+        self._last_flush = time.monotonic()
+
+    def sync(self):
+        """Flush and force everything written so far onto the disk."""
+        self.flush()
+        self._sync()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _reopen(self):
+        raise RuntimeError(f"{self.extension} output can't be resumed, use .csv or .npy")
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CsvSink(DataSink):
+    """Same CSV layout as the original logger (ISO timestamp, set and measured voltage), plus the settle time."""
+    extension = ".csv"
+    resumable = True
+
+    def _open(self):
+        self._file = open(self.path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(csv_header(self.dtype, self.measurement))
+
+    def _reopen(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        header = data.split(b"\n", 1)[0].decode().strip().split(",")
+        if header != csv_header(self.dtype, self.measurement):
+            raise RuntimeError(f"Can't resume {self.path}: its columns don't match this sweep")
+        # Keep complete lines only, a crash may have cut the last one short
+        keep = data.rfind(b"\n") + 1
+        self.rows_written = data.count(b"\n", 0, keep) - 1
+        self._file = open(self.path, 'r+', newline='')
+        self._file.truncate(keep)
+        self._file.seek(0, os.SEEK_END)
+        self._writer = csv.writer(self._file)
+
+    def _write_batch(self, batch):
+        self._writer.writerows(
+            (datetime.fromtimestamp(row[0] / 1e9).isoformat(),) + row[1:]
+            for row in batch.tolist()
+        )
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class NpySink(DataSink):
+    """Appendable .npy file of structured rows, loadable with np.load(path, mmap_mode="r").
+
+    The header is padded to a fixed size and rewritten after every batch, so
+    the file is a valid array of everything flushed so far even if the run
+    dies part way through.
+    """
+    extension = ".npy"
+    resumable = True
+    HEADER_SIZE = 256 # Grown in steps of 64 for wide multi-channel layouts
+
+    def _open(self):
+        self._file = open(self.path, 'wb')
+        # Leave room for the longest row count the header can hold
+        longest = len(self._header_text(2 ** 63 - 1)) + 2 + 8 + 1
+        self._header_size = max(self.HEADER_SIZE, -(-longest // 64) * 64)
+        self._write_header(0)
+
+    def _reopen(self):
+        self._file = open(self.path, 'r+b')
+        np.lib.format.read_magic(self._file)
+        shape, _, dtype = np.lib.format.read_array_header_1_0(self._file)
+        if dtype != self.dtype:
+            self._file.close()
+            raise RuntimeError(f"Can't resume {self.path}: its columns don't match this sweep")
+        self._header_size = self._file.tell()
+        # Rows past the header count (a batch written but not yet counted) are dropped
+        self.rows_written = shape[0]
+        self._file.truncate(self._header_size + self.rows_written * self.dtype.itemsize)
+
+    def _header_text(self, rows):
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (rows,)}
+        return repr(header).encode("latin1")
+
+    def _write_header(self, rows):
+        text = self._header_text(rows)
+        magic = np.lib.format.magic(1, 0)
+        # Magic (6 + 2 bytes) + uint16 header length + header text padded with spaces and ending in \n
+        pad = self._header_size - len(magic) - 2 - len(text) - 1
+        self._file.seek(0)
+        self._file.write(magic + (self._header_size - len(magic) - 2).to_bytes(2, "little"))
+        self._file.write(text + b" " * pad + b"\n")
+
+    def _write_batch(self, batch):
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(np.ascontiguousarray(batch).tobytes())
+        self._write_header(self.rows_written + len(batch))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(DataSink):
+    """Parquet file with one row group per batch (requires pyarrow)."""
+    extension = ".parquet"
+
+    def _open(self):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+        self._schema = pa.schema([(name, pa.int64() if name == "t_ns" else pa.float64()) for name in self.dtype.names])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+
+    def _write_batch(self, batch):
+        table = pa.table({name: batch[name] for name in self.dtype.names}, schema=self._schema)
+        self._writer.write_table(table)
+
+    def _sync(self):
+        pass # Row groups are only complete on disk once the writer is closed
+
+    def _close(self):
+        self._writer.close()
+
+
+class AsyncSinkWriter:
+    """Moves sink writes off the acquisition thread.
+
+    append() copies the row into a preallocated ring buffer and returns; a
+    background thread hands the buffered rows to the sink in batches and
+    fsyncs every fsync_interval seconds. When the ring is full the policy
+    decides: "block" waits for the writer, "drop" discards the row and counts
+    it in dropped. Errors from the writer thread are re-raised on the next
+    append() or on close(), except when the with block is already leaving on
+    an exception: then they go to log so the original error isn't replaced.
+    """
+
+    def __init__(self, sink, capacity=65536, policy="block", fsync_interval=5.0, log=print):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if capacity < 1:
+            raise ValueError("The ring buffer needs room for at least one row")
+        self.sink = sink
+        self.capacity = capacity
+        self.policy = policy
+        self.fsync_interval = fsync_interval
+        self.log = log
+        self.dropped = 0
+        self.max_depth = 0
+        self._ring = np.empty(capacity, dtype=sink.dtype)
+        self._wake_at = min(capacity, sink.batch_size) # A full ring is written even below batch_size
+        self._head = 0 # Oldest row not yet written
+        self._count = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="sink-writer", daemon=True)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except Exception as e:
+            if e.__cause__ is None or e.__cause__ is not exc.__cause__: # Not the one append() raised
+                self.log(f"⚠️ {e} (while stopping on: {exc})")
+
+    @property
+    def depth(self):
+        """Rows waiting to be written."""
+        return self._count
+
+    def open(self):
+        self.sink.open()
+        self._thread.start()
+
+    def append(self, *row):
+        with self._cond:
+            self._raise_error()
+            while self._count == self.capacity:
+                if self.policy == "drop":
+                    self.dropped += 1
+                    return
+                self._cond.wait()
+                self._raise_error()
+            self._ring[(self._head + self._count) % self.capacity] = row
+            self._count += 1
+            self.max_depth = max(self.max_depth, self._count)
+            if self._count >= self._wake_at:
+                self._cond.notify_all()
+
+    def close(self):
+        """Drain the ring, fsync and close the sink."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        try:
+            if self._error is None:
+                self.sink.sync()
+        finally:
+            self.sink.close()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"Output writer failed: {self._error}") from self._error
+
+    def _run(self):
+        last_sync = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._count >= self._wake_at or self._closing,
+                                        timeout=self.sink.flush_interval)
+                    count = self._count
+                    head = self._head
+                    if count == 0:
+                        if self._closing:
+                            return
+                        continue
+
+                # Rows [head, head + count) stay reserved until written, so no copy is needed
+                first = min(count, self.capacity - head)
+                self.sink.write_batch(self._ring[head:head + first])
+                if count > first:
+                    self.sink.write_batch(self._ring[:count - first])
+
+                with self._cond:
+                    self._head = (head + count) % self.capacity
+                    self._count -= count
+                    self._cond.notify_all()
+
+                if time.monotonic() - last_sync >= self.fsync_interval:
+                    self.sink.sync()
+                    last_sync = time.monotonic()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all() # Release a producer blocked on a full ring
+
+
+SINK_TYPES = {sink.extension: sink for sink in (CsvSink, NpySink, ParquetSink)}
+
+
+class RotatingSink:
+    """Splits the output into numbered files by size and/or age.
+
+    soak.npy is written as soak_0000.npy, soak_0001.npy, ... A new file is
+    started before a batch once the current one holds max_bytes or was
+    opened max_seconds ago (0 disables either limit). Each file is a complete
+    sink of its own, so finished files can be copied or analyzed while the
+    run goes on. Drop-in for a DataSink under AsyncSinkWriter; kwargs go to
+    every sink and on_rotate(path) is called with each new file.
+    """
+
+    def __init__(self, path, max_bytes=0, max_seconds=0, on_rotate=None, **kwargs):
+        self.base, self.extension = os.path.splitext(path)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.on_rotate = on_rotate
+        self.kwargs = kwargs
+        self.files = [] # Every path written, oldest first
+        self.rows_written = 0
+        self._sink = self._next_sink()
+
+    def _next_sink(self):
+        path = f"{self.base}_{len(self.files):04d}{self.extension}"
+        self.files.append(path)
+        return open_sink(path, **self.kwargs)
+
+    @property
+    def path(self):
+        return self._sink.path
+
+    @property
+    def dtype(self):
+        return self._sink.dtype
+
+    @property
+    def batch_size(self):
+        return self._sink.batch_size
+
+    @property
+    def flush_interval(self):
+        return self._sink.flush_interval
+
+    def open(self):
+        self._sink.open()
+        self._opened = time.monotonic()
+        if self.on_rotate:
+            self.on_rotate(self.path)
+
+    def _due(self):
+        if self.max_seconds and time.monotonic() - self._opened >= self.max_seconds:
+            return True
+        return bool(self.max_bytes) and os.path.getsize(self.path) >= self.max_bytes
+
+    def write_batch(self, batch):
+        if self._sink.rows_written and self._due():
+            self._sink.sync()
+            self._sink.close()
+            self._sink = self._next_sink()
+            self.open()
+        self._sink.write_batch(batch)
+        self.rows_written += len(batch)
+
+    def sync(self):
+        self._sink.sync()
+
+    def close(self):
+        self._sink.close()
+
+
+def output_path(file_name):
+    """Add the default .csv extension unless the name already has a supported one."""
+    file_name = file_name.strip()
+    if os.path.splitext(file_name)[1].lower() not in SINK_TYPES:
+        file_name += CsvSink.extension
+    return file_name
+
+
+def open_sink(path, **kwargs):
+    """Create the sink matching the file extension (.csv, .npy or .parquet).
+
+    kwargs go to the sink, e.g. dtype=sample_dtype(labels) or resume=True.
+    """
+    return sink_type(path)(path, **kwargs)
+
+
+def sink_type(path):
+    """Sink class for the file extension of path."""
+    return SINK_TYPES[os.path.splitext(path)[1].lower()]
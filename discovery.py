@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# *IDN? timeout per VISA interface type (ms). Serial ports that aren't
+# connected to anything are the slow ones, so they get the shortest timeout.
+INTERFACE_TIMEOUTS_MS = {
+    "ASRL": 300,
+    "GPIB": 500,
+    "USB": 1000,
+    "TCPIP": 1500,
+}
+DEFAULT_TIMEOUT_MS = 1000
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".visa_logger", "resources.json")
+DEFAULT_CACHE_TTL = 7 * 24 * 3600 # Seconds
+
+
+def interface_of(resource):
+    """'USB0::0x2A8D::...' -> 'USB'"""
+    name = resource.split("::", 1)[0].upper()
+    return name.rstrip("0123456789")
+
+
+def friendly_name(resource, idn):
+    """Display name used in the address combo boxes: "Manufacturer Model - ResourceID"."""
+    if not idn:
+        return resource
+    # Typical IDN: Manufacturer,Model,Serial,Firmware
+    parts = idn.split(',')
+    if len(parts) >= 2:
+        return f"{parts[0].strip()} {parts[1].strip()} - {resource}"
+    return f"{idn} - {resource}"
+
+
+def probe_resource(rm, resource):
+    """Open the resource and ask for *IDN?. Returns the IDN string or None."""
+    try:
+        with rm.open_resource(resource) as instr:
+            instr.timeout = INTERFACE_TIMEOUTS_MS.get(interface_of(resource), DEFAULT_TIMEOUT_MS)
+            return instr.query("*IDN?").strip()
+    except Exception:
+        return None
+
+
+class DiscoveryCache:
+    """On-disk map of resource -> last *IDN? reply, so startup doesn't wait for a scan.
+
+    Entries older than ttl seconds are ignored. Resources that never answered
+    are remembered too, which lets known_only scans skip dead serial ports.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass # A missing cache only costs a slower startup
+
+    def fresh(self):
+        """{resource: idn} for entries that answered within the TTL."""
+        cutoff = time.time() - self.ttl
+        return {res: e["idn"] for res, e in self.entries.items() if e.get("idn") and e.get("last_seen", 0) >= cutoff}
+
+    def ever_answered(self, resource):
+        return bool(self.entries.get(resource, {}).get("idn"))
+
+    def update(self, resource, idn):
+        entry = self.entries.setdefault(resource, {})
+        entry["last_probed"] = time.time()
+        if idn:
+            entry["idn"] = idn
+            entry["last_seen"] = entry["last_probed"]
+
+
+def discover(rm, cache, resources=None, known_only=False, max_workers=8):
+    """Probe resources concurrently and return {resource: idn or None}.
+
+    resources defaults to rm.list_resources(). With known_only, serial (ASRL)
+    ports that have never answered *IDN? are skipped. The cache is updated and
+    saved.
+    """
+    if resources is None:
+        resources = rm.list_resources()
+    if known_only:
+        resources = [res for res in resources if interface_of(res) != "ASRL" or cache.ever_answered(res)]
+
+    results = {}
+    if resources:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(resources)), thread_name_prefix="visa-scan") as pool:
+            for res, idn in zip(resources, pool.map(lambda r: probe_resource(rm, r), resources)):
+                results[res] = idn
+                cache.update(res, idn)
+        cache.save()
+    return results
@@ -0,0 +1,238 @@
+"""Driver profiles: the SCPI commands and fast paths of each supported PSU/DMM model.
+
+A profile is picked by the model field of the *IDN? reply (profile_for), so
+another instrument is supported by adding an entry to PSU_PROFILES or
+DMM_PROFILES instead of editing the sweep loops. Besides its commands, each
+profile declares what the instrument can do beyond one READ? per point, and
+the sweep engine takes the fastest path both instruments of a run support:
+
+- reading_buffer (SAMP:COUN, INIT/FETC?): a point's samples come back in one
+  transfer and auto settle can run its bursts. Without it the samples are
+  averaged from repeated READ? queries and the settle time is fixed.
+- binary (FORM:DATA REAL,64): bulk readings without ASCII parsing
+- external_trigger on the DMM together with list_mode on the PSU: list sweeps
+- channel_lists on the PSU ("VOLT 1.5,(@1,2)"): one write per PSU and step in
+  multi-channel sweeps instead of a select + write per channel
+- nplc_options: a requested NPLC is rounded to the nearest one the DMM has
+
+Models that match no entry get the generic SCPI profile, which assumes none
+of these. SweepConfig.psu_profile / dmm_profile force a profile by name.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Measurement functions a DMM profile can provide, see SweepConfig.measurement
+MEASUREMENTS = ("volt_dc", "curr_dc", "res_2w", "res_4w")
+
+
+@dataclass(frozen=True)
+class MeasureFunction:
+    """SCPI for one measurement function of a DMM."""
+    configure: str # e.g. "CONF:VOLT:DC", resets range, trigger and sample count
+    nplc: str # Integration time header, sent as "<nplc> 10" and queried as "<nplc>?"
+    high_impedance: Optional[tuple] = None # (on, off) commands for the >10 GΩ input, DC volts only
+
+    def nplc_command(self, value):
+        return f"{self.nplc} {value:g}"
+
+
+# Keysight (Agilent) DMM command set, shared by the 344xx and EDU344xx families
+KEYSIGHT_FUNCTIONS = {
+    "volt_dc": MeasureFunction("CONF:VOLT:DC", "VOLT:DC:NPLC", ("VOLT:IMP:AUTO ON", "VOLT:IMP:AUTO OFF")),
+    "curr_dc": MeasureFunction("CONF:CURR:DC", "CURR:DC:NPLC"),
+    "res_2w": MeasureFunction("CONF:RES", "RES:NPLC"),
+    "res_4w": MeasureFunction("CONF:FRES", "FRES:NPLC"),
+}
+
+
+@dataclass(frozen=True)
+class PsuProfile:
+    """Commands and capabilities of one family of power supplies."""
+    name: str
+    models: tuple = () # Regexes searched for in the *IDN? model field
+    channels: tuple = (1,) # Empty = not known, any channel is tried
+    select_channel: Optional[str] = "INST:NSEL {channel}" # None: single output, nothing to select
+    set_voltage: str = "VOLT {volts}"
+    set_current: str = "CURR {amps}"
+    output: str = "OUTP {state}"
+    measure_voltage: str = "MEAS:VOLT?"
+    measure_current: str = "MEAS:CURR?"
+    channel_lists: bool = False # VOLT/OUTP accept a trailing (@1,2) channel list
+    list_mode: bool = False # LIST:VOLT/DWEL with trigger out at each step (see sweep_engine.run_list_sweep)
+
+    def select_command(self, channel):
+        """Command that selects channel, None if there is nothing to select."""
+        if self.channels and channel not in self.channels:
+            raise ValueError(f"{self.name} has no channel {channel}")
+        # Unknown models: channel 1 may be the only output, only select others
+        if self.select_channel is None or (not self.channels and channel == 1):
+            return None
+        return self.select_channel.format(channel=channel)
+
+    def voltage_command(self, volts, channels=None):
+        return self._on_channels(self.set_voltage.format(volts=volts), channels)
+
+    def output_command(self, on, channels=None):
+        return self._on_channels(self.output.format(state="ON" if on else "OFF"), channels)
+
+    def _on_channels(self, command, channels):
+        if channels is None:
+            return command
+        return f"{command},{channel_list(channels)}"
+
+
+@dataclass(frozen=True)
+class DmmProfile:
+    """Commands and capabilities of one family of multimeters."""
+    name: str
+    models: tuple = ()
+    functions: dict = field(default_factory=lambda: dict(KEYSIGHT_FUNCTIONS)) # MEASUREMENTS name -> MeasureFunction
+    reading_buffer: bool = False # SAMP:COUN readings per trigger, INIT/FETC?
+    binary: bool = False # FORM:DATA REAL,64 (still verified on the instrument, see enable_binary_readings)
+    external_trigger: bool = False # TRIG:SOUR EXT with TRIG:DEL, needed for list sweeps
+    nplc_options: tuple = () # Integration times the DMM accepts, empty = any
+
+    def function(self, measurement):
+        """MeasureFunction for measurement, ValueError if this DMM doesn't have it."""
+        try:
+            return self.functions[measurement]
+        except KeyError:
+            raise ValueError(f"{self.name} profile has no {measurement} measurement") from None
+
+    def nearest_nplc(self, nplc):
+        """The supported integration time closest to nplc (nplc itself if any value goes)."""
+        if nplc is None or not self.nplc_options:
+            return nplc
+        return min(self.nplc_options, key=lambda option: abs(option - nplc))
+
+
+def channel_list(channels):
+    """SCPI channel list: [1, 3] -> '(@1,3)'"""
+    return "(@" + ",".join(str(ch) for ch in channels) + ")"
+
+
+GENERIC_PSU = PsuProfile("Generic SCPI PSU", channels=())
+
+PSU_PROFILES = [
+    PsuProfile(
+        "Keysight E36300",
+        models=(r"E363\d\dA",), # E36311A, E36312A, E36313A
+        channels=(1, 2, 3),
+        channel_lists=True,
+        list_mode=True,
+    ),
+    PsuProfile(
+        "Keysight E3631A",
+        models=(r"E3631A",),
+        channels=(1, 2, 3), # P6V, P25V, N25V
+    ),
+    PsuProfile(
+        "Keysight E36100",
+        models=(r"E361\d\dB",),
+        select_channel=None,
+    ),
+    PsuProfile(
+        "Rigol DP800",
+        models=(r"DP8\d\d",),
+        channels=(1, 2, 3),
+    ),
+]
+
+GENERIC_DMM = DmmProfile(
+    "Generic SCPI DMM",
+    functions={
+        "volt_dc": MeasureFunction("CONF:VOLT:DC", "VOLT:DC:NPLC"),
+        "curr_dc": MeasureFunction("CONF:CURR:DC", "CURR:DC:NPLC"),
+        "res_2w": MeasureFunction("CONF:RES", "RES:NPLC"),
+        "res_4w": MeasureFunction("CONF:FRES", "FRES:NPLC"),
+    },
+)
+
+DMM_PROFILES = [
+    DmmProfile(
+        "Keysight EDU34450A",
+        models=(r"EDU3445\d",),
+        reading_buffer=True,
+        binary=True,
+        external_trigger=True,
+        nplc_options=(0.02, 0.2, 1, 10),
+    ),
+    DmmProfile(
+        "Keysight 34460A/34461A",
+        models=(r"3446[01]A",),
+        reading_buffer=True,
+        binary=True,
+        external_trigger=True,
+        nplc_options=(0.02, 0.2, 1, 10, 100),
+    ),
+    DmmProfile(
+        "Keysight 34465A/34470A",
+        models=(r"344(65|70)A",),
+        reading_buffer=True,
+        binary=True,
+        external_trigger=True,
+        nplc_options=(0.001, 0.002, 0.006, 0.02, 0.06, 0.2, 1, 10, 100),
+    ),
+    DmmProfile(
+        "Keysight 34410A/34411A",
+        models=(r"3441[01]A",),
+        reading_buffer=True,
+        binary=True,
+        external_trigger=True,
+        nplc_options=(0.006, 0.02, 0.06, 0.2, 1, 2, 10, 100),
+    ),
+    DmmProfile(
+        "Keysight 34401A",
+        models=(r"34401A",),
+        # High-Z is an input setting on the 34401A, and it has no binary format
+        functions=dict(KEYSIGHT_FUNCTIONS, volt_dc=MeasureFunction(
+            "CONF:VOLT:DC", "VOLT:DC:NPLC", ("INP:IMP:AUTO ON", "INP:IMP:AUTO OFF"))),
+        reading_buffer=True,
+        external_trigger=True,
+        nplc_options=(0.02, 0.2, 1, 10, 100),
+    ),
+]
+
+
+def _model(idn):
+    """Model field of an *IDN? reply ('Manufacturer,Model,Serial,Firmware'), else the whole text."""
+    parts = idn.split(",")
+    return parts[1].strip() if len(parts) >= 2 else idn
+
+
+def _find(text, profiles):
+    for profile in profiles:
+        if any(re.search(pattern, text, re.IGNORECASE) for pattern in profile.models):
+            return profile
+    return None
+
+
+def psu_profile_for(idn, name=""):
+    """PsuProfile for an *IDN? reply, or the one called name if given."""
+    if name:
+        return profile_named(name, PSU_PROFILES + [GENERIC_PSU])
+    return _find(_model(idn or ""), PSU_PROFILES) or GENERIC_PSU
+
+
+def dmm_profile_for(idn, name=""):
+    """DmmProfile for an *IDN? reply, or the one called name if given."""
+    if name:
+        return profile_named(name, DMM_PROFILES + [GENERIC_DMM])
+    return _find(_model(idn or ""), DMM_PROFILES) or GENERIC_DMM
+
+
+def profile_named(name, profiles):
+    for profile in profiles:
+        if profile.name.lower() == name.lower():
+            return profile
+    raise ValueError(f"No instrument profile named {name!r}, known: {', '.join(p.name for p in profiles)}")
+
+
+def identify(text):
+    """'psu', 'dmm' or None for an *IDN? reply or display name that contains a known model."""
+    if _find(text, PSU_PROFILES):
+        return "psu"
+    if _find(text, DMM_PROFILES):
+        return "dmm"
+    return None
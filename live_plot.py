@@ -0,0 +1,196 @@
+import math
+import threading
+import tkinter as tk
+
+
+class PlotBuffer:
+    """Thread-safe, constant-memory store for the live plot.
+
+    Worker threads add (x, y) points. The first raw_limit points are kept as
+    is; beyond that the plot switches to min/max decimation, one bucket per
+    plot column across [x_min, x_max], so memory and drawing cost stay flat
+    no matter how many points the run has. With sort_x set (adaptive sweeps,
+    which fill in between earlier points) raw points are returned in x order
+    instead of arrival order, so the polyline doesn't zig-zag.
+    """
+
+    def __init__(self, columns=500, raw_limit=1000):
+        self.columns = columns
+        self.raw_limit = raw_limit
+        self._lock = threading.Lock()
+        self.reset(0.0, 1.0)
+
+    def reset(self, x_min, x_max, sort_x=False):
+        with self._lock:
+            self.sort_x = sort_x
+            self.x_min = min(x_min, x_max)
+            self.x_max = max(x_min, x_max)
+            if self.x_max == self.x_min:
+                self.x_max = self.x_min + 1.0
+            self.count = 0
+            self.y_min = math.inf
+            self.y_max = -math.inf
+            self._raw_x = []
+            self._raw_y = []
+            self._lo = [None] * self.columns
+            self._hi = [None] * self.columns
+            self._dirty = set()
+            self.generation = getattr(self, "generation", 0) + 1
+
+    def add(self, x, y):
+        if math.isnan(y):
+            return
+        col = int((x - self.x_min) / (self.x_max - self.x_min) * (self.columns - 1) + 0.5)
+        col = min(max(col, 0), self.columns - 1)
+        with self._lock:
+            self.count += 1
+            if self.count <= self.raw_limit:
+                self._raw_x.append(x)
+                self._raw_y.append(y)
+            lo = self._lo[col]
+            if lo is None or y < lo:
+                self._lo[col] = y
+            hi = self._hi[col]
+            if hi is None or y > hi:
+                self._hi[col] = y
+            self._dirty.add(col)
+            if y < self.y_min:
+                self.y_min = y
+            if y > self.y_max:
+                self.y_max = y
+
+    def take_updates(self, full=False):
+        """Return (count, y_min, y_max, raw_points, columns) changed since the last call.
+
+        raw_points is [(x, y), ...] while the run is below raw_limit, else None.
+        columns maps column -> (lo, hi), for every filled column if full is set.
+        """
+        with self._lock:
+            cols = range(self.columns) if full else self._dirty
+            columns = {c: (self._lo[c], self._hi[c]) for c in cols if self._lo[c] is not None}
+            self._dirty = set()
+            raw = list(zip(self._raw_x, self._raw_y)) if self.count <= self.raw_limit else None
+            if raw and self.sort_x:
+                raw.sort()
+            return self.count, self.y_min, self.y_max, raw, columns
+
+
+class LivePlot(tk.Canvas):
+    """Measured vs. set voltage, redrawn incrementally from a PlotBuffer.
+
+    Call refresh() once per UI frame. Canvas items are reused: in raw mode a
+    single polyline has its coords replaced, in decimated mode only the
+    column segments that changed are moved. Everything is redrawn only when
+    the y axis has to grow.
+    """
+    MARGIN_LEFT = 60
+    MARGIN_RIGHT = 10
+    MARGIN_TOP = 10
+    MARGIN_BOTTOM = 20
+
+    def __init__(self, parent, buffer, **kwargs):
+        kwargs.setdefault("height", 200)
+        kwargs.setdefault("background", "white")
+        super().__init__(parent, **kwargs)
+        self.buffer = buffer
+        self._generation = None
+        self._view = None # (y_lo, y_hi) currently drawn
+        self._drawn_count = 0
+        self._raw_line = None
+        self._col_items = {}
+        self.bind("<Configure>", lambda e: self._redraw_all())
+
+    def refresh(self):
+        if self._generation != self.buffer.generation:
+            self._clear()
+            self._generation = self.buffer.generation
+
+        count, y_min, y_max, raw, columns = self.buffer.take_updates()
+        if not count or count == self._drawn_count:
+            return
+        self._drawn_count = count
+        if self._view is None or y_min < self._view[0] or y_max > self._view[1]:
+            self._view = self._nice_range(y_min, y_max)
+            self._redraw_all()
+            return
+        self._draw(raw, columns)
+
+    def _clear(self):
+        self.delete("all")
+        self._view = None
+        self._drawn_count = 0
+        self._raw_line = None
+        self._col_items = {}
+
+    def _redraw_all(self):
+        if self._view is None:
+            return
+        count, y_min, y_max, raw, columns = self.buffer.take_updates(full=True)
+        self.delete("all")
+        self._raw_line = None
+        self._col_items = {}
+        self._draw_axes()
+        self._draw(raw, columns)
+
+    def _draw(self, raw, columns):
+        if raw is not None:
+            if len(raw) < 2:
+                return
+            coords = []
+            for x, y in raw:
+                coords.append(self._px(x))
+                coords.append(self._py(y))
+            if self._raw_line is None:
+                self._raw_line = self.create_line(*coords, fill="#1E90FF")
+            else:
+                self.coords(self._raw_line, *coords)
+            return
+
+        if self._raw_line is not None:
+            # Switched to decimation, bring in every column once
+            self.delete(self._raw_line)
+            self._raw_line = None
+            columns = self.buffer.take_updates(full=True)[4]
+
+        for col, (lo, hi) in columns.items():
+            x = self._col_px(col)
+            y_lo, y_hi = self._py(lo), self._py(hi)
+            coords = (x, y_lo + 1, x, y_hi) # Keep flat columns one pixel tall
+            item = self._col_items.get(col)
+            if item is None:
+                self._col_items[col] = self.create_line(*coords, fill="#1E90FF")
+            else:
+                self.coords(item, *coords)
+
+    def _draw_axes(self):
+        w, h = self.winfo_width(), self.winfo_height()
+        left, right = self.MARGIN_LEFT, w - self.MARGIN_RIGHT
+        top, bottom = self.MARGIN_TOP, h - self.MARGIN_BOTTOM
+        self.create_rectangle(left, top, right, bottom, outline="gray")
+        y_lo, y_hi = self._view
+        self.create_text(left - 4, top, text=f"{y_hi:.4g} V", anchor="ne", font=("TkDefaultFont", 8))
+        self.create_text(left - 4, bottom, text=f"{y_lo:.4g} V", anchor="se", font=("TkDefaultFont", 8))
+        self.create_text(left, bottom + 2, text=f"{self.buffer.x_min:.4g} V", anchor="nw", font=("TkDefaultFont", 8))
+        self.create_text(right, bottom + 2, text=f"{self.buffer.x_max:.4g} V", anchor="ne", font=("TkDefaultFont", 8))
+        self.create_text((left + right) / 2, bottom + 2, text="Set Voltage", anchor="n",
+                         font=("TkDefaultFont", 8), fill="gray")
+
+    def _px(self, x):
+        b = self.buffer
+        span = self.winfo_width() - self.MARGIN_LEFT - self.MARGIN_RIGHT
+        return self.MARGIN_LEFT + (x - b.x_min) / (b.x_max - b.x_min) * span
+
+    def _col_px(self, col):
+        span = self.winfo_width() - self.MARGIN_LEFT - self.MARGIN_RIGHT
+        return self.MARGIN_LEFT + col / (self.buffer.columns - 1) * span
+
+    def _py(self, y):
+        y_lo, y_hi = self._view
+        span = self.winfo_height() - self.MARGIN_TOP - self.MARGIN_BOTTOM
+        return self.MARGIN_TOP + (y_hi - y) / (y_hi - y_lo) * span
+
+    @staticmethod
+    def _nice_range(y_min, y_max):
+        # 10% headroom so the axis only has to grow (and redraw) now and then
+        span = y_max - y_min or abs(y_max) or 1.0
+        return y_min - 0.1 * span, y_max + 0.1 * span
@@ -0,0 +1,235 @@
+"""Sweeps that drive several PSU channels and read several DMMs at once.
+
+Every channel steps through the same setpoints. Each PSU and each DMM gets
+its own I/O thread, so setting N channels and reading N DMMs takes about as
+long as one, and every step becomes one row with a reading column per
+channel. Built from a SweepConfig with channels set, usually through
+sweep_engine.create_run().
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import drivers
+from sweep_engine import (SweepRun, SweepStats, _noop, check_instrument_errors, enable_error_status,
+                          poll_instrument_errors, timestamp_ns)
+
+
+@dataclass
+class PsuGroup:
+    """One PSU session, its driver profile and the channels swept on it."""
+    session: object
+    name: str
+    profile: drivers.PsuProfile = drivers.GENERIC_PSU
+    channels: list = field(default_factory=list)
+
+    def set_voltage(self, v_set):
+        self._write_all(lambda channels: self.profile.voltage_command(v_set, channels))
+
+    def set_output(self, on):
+        self._write_all(lambda channels: self.profile.output_command(on, channels))
+
+    def _write_all(self, command):
+        """command(channels) on every channel: one write with a channel list where the PSU takes them."""
+        if self.profile.channel_lists:
+            self.session.write(command(self.channels))
+            return
+        for channel in self.channels:
+            select = self.profile.select_command(channel)
+            if select:
+                self.session.write(select)
+            self.session.write(command(None))
+
+
+@dataclass
+class DmmGroup:
+    """One DMM session and the row columns it fills, with an optional scanner route per column."""
+    session: object
+    name: str
+    profile: drivers.DmmProfile = drivers.GENERIC_DMM
+    columns: list = field(default_factory=list)
+    routes: list = field(default_factory=list)
+    measure: Optional[Callable] = None
+    settle: Optional[Callable] = None # AutoSettle, None for a fixed settle time
+
+    def read(self):
+        """Measure every column of this DMM. Returns (readings, seconds spent auto settling)."""
+        readings = []
+        settle_s = 0.0
+        for route in self.routes:
+            if route:
+                # Exclusive close also opens the previous column's channel, so inputs are never paralleled
+                self.session.write(f"ROUT:CLOS:EXCL {route}")
+            if self.settle:
+                start = time.perf_counter()
+                self.settle()
+                settle_s += time.perf_counter() - start
+            readings.append(self.measure())
+        return readings, settle_s
+
+
+def run_multi_sweep(psus, dmms, voltages, settle_t, on_step, should_continue, log,
+                    error_check_interval=25, on_settle=_noop):
+    """Set every PSU group, settle, then read every DMM group in parallel.
+
+    on_step(idx, v_set, readings, t_ns, settle_s) gets one reading per
+    column, in column order. If every DMM group auto settles, settle_t is not
+    slept and settle_s is the slowest DMM's settle time. As soon as one group
+    has no AutoSettle (e.g. a DMM without a reading buffer) settle_t is slept
+    for all of them.
+    """
+    stats = SweepStats()
+    columns = sum(len(d.columns) for d in dmms)
+    fixed_settle = not all(d.settle for d in dmms)
+
+    with ExitStack() as stack:
+        psu_io = [stack.enter_context(ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{p.name}-io"))
+                  for p in psus]
+        dmm_io = [stack.enter_context(ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{d.name}-io"))
+                  for d in dmms]
+
+        for idx, v_set in enumerate(voltages):
+            if not should_continue():
+                break
+
+            step_start = time.perf_counter()
+
+            # All PSUs are written in parallel, every channel must be set before the settle
+            for pending in [io.submit(p.set_voltage, v_set) for p, io in zip(psus, psu_io)]:
+                pending.result()
+            pending_err = []
+            if (idx + 1) % error_check_interval == 0:
+                pending_err = [(p, io.submit(poll_instrument_errors, p.session, p.name, log))
+                               for p, io in zip(psus, psu_io)]
+
+            # Settle
+            on_settle(v_set)
+            settle_start = time.perf_counter()
+            if fixed_settle:
+                time.sleep(settle_t)
+            settle_actual = time.perf_counter() - settle_start
+
+            # Measure
+            row = [math.nan] * columns
+            for d, pending in [(d, io.submit(d.read)) for d, io in zip(dmms, dmm_io)]:
+                readings, settle_s = pending.result()
+                for column, v_read in zip(d.columns, readings):
+                    row[column] = v_read
+                settle_actual = max(settle_actual, settle_s)
+            t_ns = timestamp_ns()
+
+            failed = [p.name for p, pending in pending_err if not pending.result()]
+            if failed:
+                log(f"⚠️ Stopping due to {', '.join(failed)} error at or before {v_set:.3f}V")
+                stats.ok = False
+                break
+
+            on_step(idx, v_set, tuple(row), t_ns, settle_actual)
+
+            stats.overhead_total += (time.perf_counter() - step_start) - settle_actual
+            stats.settle_total += settle_actual
+            stats.steps_done += 1
+
+        # Final error check covers the steps since the last poll
+        if stats.ok:
+            for p, io in zip(psus, psu_io):
+                if not io.submit(poll_instrument_errors, p.session, p.name, log).result():
+                    log(f"⚠️ {p.name} reported errors during the final steps of the sweep")
+
+    return stats
+
+
+class MultiChannelRun(SweepRun):
+    """SweepRun over config.channels: one output row per step, one reading column per channel."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.psus = []
+        self.dmms = []
+
+    def _connect(self):
+        maps = self.config.channel_maps()
+        self.channel_labels = [m.label for m in maps]
+        psus = {}
+        dmms = {}
+        try:
+            for column, m in enumerate(maps):
+                if m.psu_address not in psus:
+                    name = f"PSU{len(psus) + 1}"
+                    session, idn = self._open_session(m.psu_address, name)
+                    psus[m.psu_address] = PsuGroup(session, name, self._psu_profile_for(idn, name))
+                if m.channel not in psus[m.psu_address].channels:
+                    psus[m.psu_address].channels.append(m.channel)
+                if m.dmm_address not in dmms:
+                    name = f"DMM{len(dmms) + 1}"
+                    session, idn = self._open_session(m.dmm_address, name)
+                    dmms[m.dmm_address] = DmmGroup(session, name, self._dmm_profile_for(idn, name))
+                dmms[m.dmm_address].columns.append(column)
+                dmms[m.dmm_address].routes.append(m.dmm_route)
+        except Exception as e:
+            self.log(f"Connection Failed: {e}")
+            raise
+        finally:
+            # Whatever was opened is turned off / released by force_cleanup
+            self.psus = list(psus.values())
+            self.dmms = list(dmms.values())
+
+        for p in self.psus:
+            enable_error_status(p.session)
+        self.log(f"Multi-channel sweep: {len(maps)} channels on {len(self.psus)} PSU(s), {len(self.dmms)} DMM(s)")
+
+    def _configure(self):
+        for p in self.psus:
+            for channel in p.channels:
+                self._configure_psu(p.session, channel, p.profile)
+            if not check_instrument_errors(p.session, p.name, self.log):
+                self.log(f"⚠️ Aborting due to {p.name} error")
+                return False
+
+        self.samples = max(1, self.config.samples_per_point)
+        for d in self.dmms:
+            binary, d.settle = self._configure_dmm(d.session, d.name, d.profile)
+            d.measure = self._dmm_reader(d.session, d.profile, binary)
+            if not check_instrument_errors(d.session, d.name, self.log):
+                self.log(f"⚠️ Aborting due to {d.name} error")
+                return False
+        return True
+
+    def _output_on(self):
+        for p in self.psus:
+            self.log(f"Enabling Output on {p.name} channels {', '.join(map(str, p.channels))}")
+            p.set_output(True)
+
+    def _set_start(self, v_set):
+        for p in self.psus:
+            p.set_voltage(v_set)
+
+    def _run_loop(self, voltages, on_step, on_settle):
+        cfg = self.config
+        stats = run_multi_sweep(
+            self.psus, self.dmms, voltages, cfg.settle_time,
+            on_step=on_step,
+            should_continue=lambda: self.is_running,
+            log=self.log,
+            error_check_interval=cfg.error_check_interval,
+            on_settle=on_settle,
+        )
+        for d in self.dmms:
+            if d.settle and d.settle.timeouts:
+                self.log(f"{d.name} auto settle hit the {cfg.settle_time:g} s timeout on {d.settle.timeouts} readings")
+        return stats
+
+    def force_cleanup(self):
+        """Turn every swept output off and release the sessions. Safe to call twice."""
+        psus, self.psus = self.psus, []
+        self.dmms = []
+        for p in psus:
+            try:
+                self.log(f"Turning off {p.name} Output...")
+                p.set_output(False)
+            except Exception:
+                pass
+        self._release_sessions()
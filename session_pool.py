@@ -0,0 +1,58 @@
+import threading
+
+
+class SessionPool:
+    """Keeps VISA sessions open across runs.
+
+    The first acquire() of an address opens it, asks *IDN? and drains the
+    error queue; later runs get the same handle back without paying for any
+    of that. A run that hits an I/O error should discard() the addresses it
+    used so the next run reopens them (e.g. after an instrument power cycle).
+    """
+
+    def __init__(self, rm, on_open=None):
+        self.rm = rm
+        self.on_open = on_open # Called with the new session, e.g. to drain its error queue
+        self._sessions = {} # address -> (session, idn)
+        self._lock = threading.Lock()
+
+    def acquire(self, address):
+        """Return (session, idn, reused) for address, opening it on first use."""
+        with self._lock:
+            entry = self._sessions.get(address)
+        if entry is not None:
+            return entry[0], entry[1], True
+
+        session = self.rm.open_resource(address)
+        try:
+            idn = session.query("*IDN?").strip()
+            if self.on_open:
+                self.on_open(session)
+        except Exception:
+            session.close()
+            raise
+        with self._lock:
+            self._sessions[address] = (session, idn)
+        return session, idn, False
+
+    def discard(self, address):
+        """Close and forget one session, the next acquire() reopens it."""
+        with self._lock:
+            entry = self._sessions.pop(address, None)
+        if entry is not None:
+            try:
+                entry[0].close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        with self._lock:
+            addresses = list(self._sessions)
+        for address in addresses:
+            self.discard(address)
+
+    def __contains__(self, address):
+        return address in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
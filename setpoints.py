@@ -0,0 +1,355 @@
+"""Setpoint sequences for the sweep engine.
+
+Every source knows its length and yields setpoints lazily, so the number of
+points (and the time estimate) is known without building the whole list and
+a million point profile never sits in memory. Sources can be sliced from a
+start index, source[n:], which is how a resumed run skips the points it
+already has.
+"""
+import csv
+import decimal
+import heapq
+import itertools
+import math
+import os
+
+import numpy as np
+
+# Setpoints are rounded to this many significant digits, far below any PSU resolution
+SIGNIFICANT_DIGITS = 12
+
+
+def _decimals(value):
+    """Decimal places needed to write value as typed, e.g. 0.01 -> 2, 1e-05 -> 5."""
+    exponent = decimal.Decimal(repr(float(value))).as_tuple().exponent
+    return min(SIGNIFICANT_DIGITS, max(0, -exponent))
+
+
+def _clean(value):
+    """Drop float noise past SIGNIFICANT_DIGITS, e.g. 1.0000000000000002 -> 1.0"""
+    return float(f"{value:.{SIGNIFICANT_DIGITS}g}")
+
+
+class SetpointSource:
+    """Base for sized, lazily iterated setpoint sequences."""
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) and index.step in (None, 1) and index.stop is None:
+            return SkippedSetpoints(self, index.start or 0)
+        raise TypeError("Setpoint sources only support source[start:]")
+
+    def bounds(self):
+        """(lowest, highest) setpoint."""
+        raise NotImplementedError
+
+    def describe(self):
+        raise NotImplementedError
+
+
+class SkippedSetpoints(SetpointSource):
+    """A source without its first skip points."""
+
+    def __init__(self, source, skip):
+        self.source = source
+        self.skip = min(max(0, skip), len(source))
+
+    def __len__(self):
+        return len(self.source) - self.skip
+
+    def __iter__(self):
+        return itertools.islice(iter(self.source), self.skip, None)
+
+    def bounds(self):
+        return self.source.bounds()
+
+    def describe(self):
+        return f"{self.source.describe()}, from point {self.skip + 1}"
+
+
+class LinearSetpoints(SetpointSource):
+    """start to stop (inclusive) in steps of step, either direction.
+
+    Each point is computed from its index and rounded to the decimals of start
+    and step, so 0.01 steps give 1.01 rather than a sum of 101 rounding errors.
+    """
+
+    def __init__(self, start, stop, step):
+        if step <= 0:
+            raise ValueError("Step size must be positive")
+        self.start = start
+        self.stop = stop
+        self.step = step if stop >= start else -step
+        self.count = int(abs(stop - start) / step + 1e-6) + 1
+        self.decimals = max(_decimals(start), _decimals(step))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            if not -self.count <= index < self.count:
+                raise IndexError("setpoint index out of range")
+            return self.voltage(index % self.count)
+        return super().__getitem__(index)
+
+    def voltage(self, index):
+        return round(self.start + index * self.step, self.decimals)
+
+    def __iter__(self):
+        return (self.voltage(i) for i in range(self.count))
+
+    def bounds(self):
+        last = self.voltage(self.count - 1)
+        return min(self.start, last), max(self.start, last)
+
+    def describe(self):
+        return f"{self.start:g} to {self.stop:g} V step {abs(self.step):g}"
+
+
+class LogSetpoints(SetpointSource):
+    """Logarithmically spaced setpoints, points_per_decade per factor of 10, stop always included."""
+
+    def __init__(self, start, stop, points_per_decade=10):
+        if start <= 0 or stop <= 0:
+            raise ValueError("Logarithmic setpoints need positive start and stop voltages")
+        if points_per_decade <= 0:
+            raise ValueError("Points per decade must be positive")
+        self.start = start
+        self.stop = stop
+        self.points_per_decade = points_per_decade
+        steps = abs(math.log10(stop / start)) * points_per_decade
+        self.steps = int(steps + 1e-9)
+        # Stop is added as a last, shorter step if it isn't on the grid
+        self.count = self.steps + 1 + (steps - self.steps > 1e-9)
+        self.direction = 1 if stop >= start else -1
+
+    def __len__(self):
+        return self.count
+
+    def voltage(self, index):
+        if index > self.steps:
+            return float(self.stop)
+        return _clean(self.start * 10 ** (self.direction * index / self.points_per_decade))
+
+    def __iter__(self):
+        return (self.voltage(i) for i in range(self.count))
+
+    def bounds(self):
+        return min(self.start, self.stop), max(self.start, self.stop)
+
+    def describe(self):
+        return f"{self.start:g} to {self.stop:g} V, {self.points_per_decade:g} points/decade"
+
+
+class PiecewiseSetpoints(SetpointSource):
+    """Linear segments [(start, stop, step), ...] run back to back.
+
+    A segment starting where the previous one ended doesn't repeat that point.
+    """
+
+    def __init__(self, segments):
+        if not segments:
+            raise ValueError("At least one segment is needed")
+        self.segments = [LinearSetpoints(*segment) for segment in segments]
+        self._skips = [0] + [int(prev.voltage(len(prev) - 1) == seg.voltage(0))
+                             for prev, seg in zip(self.segments, self.segments[1:])]
+
+    def __len__(self):
+        return sum(len(seg) - skip for seg, skip in zip(self.segments, self._skips))
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(itertools.islice(iter(seg), skip, None)
+                                             for seg, skip in zip(self.segments, self._skips))
+
+    def bounds(self):
+        lows, highs = zip(*(seg.bounds() for seg in self.segments))
+        return min(lows), max(highs)
+
+    def describe(self):
+        low, high = self.bounds()
+        return f"{len(self.segments)} segments, {low:g} to {high:g} V"
+
+
+class FileSetpoints(SetpointSource):
+    """Setpoints read from a file while the sweep runs.
+
+    .npy: a 1-D array, or a structured array with a v_set column (a previous
+    sweep's output), memory-mapped. .csv/.txt: one value per line, or the
+    "Set Voltage (V)" column if the file has that header; a non-numeric first
+    line is treated as a header.
+    """
+    CHUNK = 65536
+    _scan_cache = {} # (path, size, mtime) -> (count, low, high)
+
+    def __init__(self, path):
+        self.path = path
+        self.is_npy = os.path.splitext(path)[1].lower() == ".npy"
+        if not os.path.exists(path):
+            raise ValueError(f"Setpoint file not found: {path}")
+
+    def _array(self):
+        data = np.load(self.path, mmap_mode="r")
+        if data.dtype.names:
+            if "v_set" not in data.dtype.names:
+                raise ValueError(f"{self.path} has no v_set column")
+            return data["v_set"]
+        return data.reshape(len(data), -1)[:, 0] if data.ndim > 1 else data
+
+    def __iter__(self):
+        if self.is_npy:
+            return self._iter_npy()
+        return self._iter_csv()
+
+    def _iter_npy(self):
+        values = self._array()
+        for start in range(0, len(values), self.CHUNK):
+            yield from values[start:start + self.CHUNK].tolist()
+
+    def _iter_csv(self):
+        with open(self.path, newline="") as f:
+            rows = csv.reader(f)
+            first = next(rows, None)
+            if first is None:
+                return
+            try:
+                column = 0
+                yield float(first[0])
+            except (ValueError, IndexError):
+                column = first.index("Set Voltage (V)") if "Set Voltage (V)" in first else 0
+            for row in rows:
+                if row:
+                    yield float(row[column])
+
+    def _scan(self):
+        """Count and range of the setpoints, one pass over the file, cached until it changes."""
+        stat = os.stat(self.path)
+        key = (os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._scan_cache:
+            if self.is_npy:
+                values = self._array()
+                count = len(values)
+                low, high = (float(values.min()), float(values.max())) if count else (0.0, 0.0)
+            else:
+                count, low, high = 0, math.inf, -math.inf
+                for v in self._iter_csv():
+                    count += 1
+                    low = min(low, v)
+                    high = max(high, v)
+                if not count:
+                    low = high = 0.0
+            self._scan_cache[key] = (count, low, high)
+        return self._scan_cache[key]
+
+    def __len__(self):
+        return self._scan()[0]
+
+    def bounds(self):
+        return self._scan()[1:]
+
+    def describe(self):
+        return f"{len(self)} points from {os.path.basename(self.path)}"
+
+
+class AdaptivePlanner:
+    """Setpoints that refine themselves from the measured curve.
+
+    All setpoints lie on the grid start + k * min_step. A coarse pass
+    measures every coarse_factor-th grid point (and stop). Then, largest
+    error first, intervals are bisected: the measured midpoint is compared to
+    the linear interpolation of the interval ends, and if it is off by more
+    than tolerance both halves are queued for another split. Flat or linear
+    regions stay coarse, knees get grid resolution. At most max_points are
+    measured.
+
+    Iterate it to get the next setpoint, and call record() with the reading
+    before asking for the one after; run_serial_sweep does this when its
+    on_step calls record(). Points come in acquisition order, not sorted by
+    voltage.
+    """
+
+    def __init__(self, start, stop, min_step, coarse_factor=16, tolerance=0.005, max_points=2000):
+        if min_step <= 0:
+            raise ValueError("Step size must be positive")
+        self.start = start
+        self.step = min_step if stop >= start else -min_step
+        self.grid_points = int(abs(stop - start) / min_step + 1e-6) + 1
+        self.decimals = max(_decimals(start), _decimals(min_step))
+        self.coarse_factor = max(1, int(coarse_factor))
+        self.tolerance = tolerance
+        self.max_points = max(2, int(max_points))
+        self.readings = {} # Grid index -> measured value
+        self.refined = 0 # Midpoints added after the coarse pass
+        self._pending = None
+
+    def __len__(self):
+        """Upper bound on the number of points measured."""
+        return min(self.max_points, self.grid_points)
+
+    def voltage(self, index):
+        return round(self.start + index * self.step, self.decimals)
+
+    def bounds(self):
+        last = self.voltage(self.grid_points - 1)
+        return min(self.start, last), max(self.start, last)
+
+    def describe(self):
+        return f"{self.start:g} to {self.voltage(self.grid_points - 1):g} V adaptive, step {abs(self.step):g}"
+
+    def record(self, v_set, v_read):
+        if self._pending is not None:
+            self.readings[self._pending] = v_read
+            self._pending = None
+
+    def __iter__(self):
+        last = self.grid_points - 1
+        coarse = list(range(0, last + 1, self.coarse_factor))
+        if coarse[-1] != last:
+            coarse.append(last)
+        # The coarse pass is the first thing cut if max_points is very low
+        coarse = coarse[:self.max_points]
+
+        for index in coarse:
+            yield from self._measure(index)
+
+        # Curvature estimate at each coarse point from its two neighbours; an
+        # interval is refined if either of its ends bends by more than tolerance
+        bend = [0.0] * len(coarse)
+        for pos in range(1, len(coarse) - 1):
+            bend[pos] = self._midpoint_error(coarse[pos - 1], coarse[pos], coarse[pos + 1])
+
+        heap = [] # (-error, left index, right index)
+        for pos in range(len(coarse) - 1):
+            left, right = coarse[pos], coarse[pos + 1]
+            error = max(bend[pos], bend[pos + 1])
+            if error > self.tolerance and right - left >= 2:
+                heapq.heappush(heap, (-error, left, right))
+
+        while heap and len(self.readings) < self.max_points:
+            _, left, right = heapq.heappop(heap)
+            mid = (left + right) // 2
+            yield from self._measure(mid)
+            self.refined += 1
+            error = self._midpoint_error(left, mid, right)
+            if error > self.tolerance:
+                for a, b in ((left, mid), (mid, right)):
+                    if b - a >= 2:
+                        heapq.heappush(heap, (-error, a, b))
+
+    def _measure(self, index):
+        self._pending = index
+        yield self.voltage(index)
+        if self._pending is not None:
+            raise RuntimeError("AdaptivePlanner.record() was not called for the last setpoint")
+
+    def _midpoint_error(self, left, mid, right):
+        """|reading at mid - linear interpolation between left and right|, 0 if any is NaN."""
+        y0, y1, y2 = self.readings[left], self.readings[mid], self.readings[right]
+        expected = y0 + (y2 - y0) * (mid - left) / (right - left)
+        error = abs(y1 - expected)
+        return 0.0 if math.isnan(error) else error
@@ -0,0 +1,436 @@
+"""In-process simulated E36313A PSUs and EDU34450A DMMs.
+
+SimResourceManager stands in for pyvisa.ResourceManager, so the GUI, the
+sweep engine and the benchmarks run without hardware:
+
+    rm = SimResourceManager(latency={"READ?": 0.02, "default": 0.002})
+    SweepRun(SweepConfig(psu_address=SIM_PSU_ADDRESS, dmm_address=SIM_DMM_ADDRESS), rm).run()
+
+Each DMM measures a PSU channel through a DUT transfer function (default: a
+2:1 divider), optionally with a first-order settling time constant after
+every setpoint change. By default the first DMM follows whichever channel of
+the first PSU is selected; pass wiring for racks with several instruments.
+Only the SCPI subset used by this project is understood; anything else
+queues -113 "Undefined header" like a real instrument would.
+"""
+import threading
+import time
+
+import numpy as np
+
+SIM_PSU_ADDRESS = "SIM::PSU::E36313A::INSTR"
+SIM_DMM_ADDRESS = "SIM::DMM::EDU34450A::INSTR"
+
+# Standard Event Status Register bits
+ESR_OPC = 0x01
+ESR_CME = 0x20
+# Status Byte bits
+STB_EAV = 0x04
+STB_ESB = 0x20
+
+NO_ERROR = '+0,"No error"'
+UNDEFINED_HEADER = '-113,"Undefined header"'
+
+
+def divider_dut(v_set):
+    """Default DUT: 2:1 resistive divider."""
+    return 0.5 * v_set
+
+
+def sim_psu_address(index):
+    """Address of the index-th simulated PSU, SIM_PSU_ADDRESS for the first."""
+    return SIM_PSU_ADDRESS if index == 0 else f"SIM::PSU{index + 1}::E36313A::INSTR"
+
+
+def sim_dmm_address(index):
+    """Address of the index-th simulated DMM, SIM_DMM_ADDRESS for the first."""
+    return SIM_DMM_ADDRESS if index == 0 else f"SIM::DMM{index + 1}::EDU34450A::INSTR"
+
+
+def parse_channel_list(arg):
+    """'1.5,(@1,2)' -> ('1.5', [1, 2]); '(@1:3)' -> ('', [1, 2, 3]); no list -> (arg, None)."""
+    value, sep, channels = arg.partition("(@")
+    if not sep:
+        return arg.strip(), None
+    result = []
+    for item in channels.rstrip(") ").split(","):
+        first, _, last = item.partition(":")
+        result.extend(range(int(first), int(last or first) + 1))
+    return value.strip().rstrip(","), result
+
+
+class SimOutput:
+    """One PSU channel: setpoint, output state and settling."""
+
+    def __init__(self):
+        self.setpoint = 0.0
+        self.on = False
+        self.settle_from = 0.0 # DUT voltage when the setpoint last changed
+        self.changed_at = time.perf_counter()
+
+
+class SimBench:
+    """Shared state between the simulated instruments.
+
+    wiring maps a DMM index to the (PSU index, channel) it measures, or to
+    {route: (PSU index, channel)} for a DMM with a scanner (ROUT:CLOS:EXCL (@n)).
+    Unwired DMMs follow the selected channel of PSU 0.
+    """
+
+    def __init__(self, dut=divider_dut, noise=0.0, settle_tau=0.0, seed=0, psu_count=1, wiring=None):
+        self.dut = dut
+        self.noise = noise
+        self.settle_tau = settle_tau # Seconds, 0 = output follows the setpoint instantly
+        self.rng = np.random.default_rng(seed)
+        self.outputs = [{ch: SimOutput() for ch in (1, 2, 3)} for _ in range(psu_count)]
+        self.selected = [1] * psu_count # INST:NSEL per PSU
+        self.wiring = dict(wiring or {})
+        self.dmms = {} # DMM index -> latest session, receives PSU trigger outputs
+
+    def set_output(self, psu, channel, voltage):
+        out = self.outputs[psu][channel]
+        if self.settle_tau:
+            out.settle_from = self._dut_now(out)
+            out.changed_at = time.perf_counter()
+        out.setpoint = voltage
+
+    def set_enabled(self, psu, channel, on):
+        self.outputs[psu][channel].on = on
+
+    def source_of(self, dmm, route=None):
+        """(PSU index, channel) a DMM is measuring."""
+        wired = self.wiring.get(dmm)
+        if isinstance(wired, dict):
+            wired = wired.get(route)
+        return wired or (0, self.selected[0])
+
+    def _dut_now(self, out, offset=0.0):
+        target = self.dut(out.setpoint) if out.on else 0.0
+        if not self.settle_tau:
+            return target
+        elapsed = time.perf_counter() - out.changed_at + offset
+        return target + (out.settle_from - target) * np.exp(-elapsed / self.settle_tau)
+
+    def dut_voltage(self, count, spacing=0.0, dmm=0, route=None):
+        """count readings for a DMM, spaced spacing seconds apart, starting now."""
+        psu, channel = self.source_of(dmm, route)
+        out = self.outputs[psu][channel]
+        if self.settle_tau:
+            v = self._dut_now(out, np.arange(count) * spacing)
+        else:
+            v = np.full(count, self._dut_now(out))
+        return v + (self.rng.normal(0.0, self.noise, count) if self.noise else 0.0)
+
+
+class SimInstrument:
+    """Common session behaviour: latency, error queue and status registers."""
+    idn = "Simulated,Instrument,0,0"
+
+    def __init__(self, resource_name, bench, latency, lock):
+        self.resource_name = resource_name
+        self.bench = bench
+        self.latency = latency
+        self.timeout = 2000
+        self._lock = lock # One transfer at a time per session, like a real VISA session
+        self.errors = []
+        self.esr = 0
+        self.ese = 0
+        self.counts = {}
+        self.busy_time = 0.0 # Seconds spent in simulated transfers
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.closed = True
+
+    def write(self, command):
+        with self._lock:
+            self._delay(command)
+            for part in command.split(";"):
+                part = part.strip()
+                if part:
+                    self._handle(part)
+
+    def query(self, command):
+        with self._lock:
+            self._delay(command)
+            response = self._handle(command.strip())
+            return "" if response is None else f"{response}\n"
+
+    def query_binary_values(self, command, datatype="d", is_big_endian=False, container=list):
+        # Only REAL,64 is simulated, which is all the engine asks for
+        with self._lock:
+            self._delay(command)
+            return container(np.asarray(self._handle(command.strip()), dtype=np.float64))
+
+    def _delay(self, command):
+        if self.closed:
+            raise RuntimeError(f"{self.resource_name}: session is closed") # pyvisa raises InvalidSession
+        header = command.split()[0] if command.strip() else ""
+        self.counts[header] = self.counts.get(header, 0) + 1
+        delay = self.latency.get(header, self.latency.get("default", 0.0))
+        if delay:
+            start = time.perf_counter()
+            time.sleep(delay)
+            self.busy_time += time.perf_counter() - start
+
+    def _error(self, error=UNDEFINED_HEADER):
+        self.errors.append(error)
+        self.esr |= ESR_CME
+
+    def _handle(self, command):
+        header, _, arg = command.partition(" ")
+        header = header.upper().lstrip(":")
+        if header == "*IDN?":
+            return self.idn
+        if header == "*OPC?":
+            return 1
+        if header == "*OPC":
+            self.esr |= ESR_OPC
+            return None
+        if header == "*CLS":
+            self.errors.clear()
+            self.esr = 0
+            return None
+        if header == "*ESE":
+            self.ese = int(float(arg))
+            return None
+        if header == "*ESR?":
+            esr, self.esr = self.esr, 0
+            return esr
+        if header == "*STB?":
+            stb = STB_EAV if self.errors else 0
+            if self.esr & self.ese:
+                stb |= STB_ESB
+            return stb
+        if header in ("SYST:ERR?", "SYSTEM:ERROR?"):
+            return self.errors.pop(0) if self.errors else NO_ERROR
+        response = self._handle_specific(header, arg)
+        if response is NotImplemented:
+            self._error()
+            return None
+        return response
+
+    def _handle_specific(self, header, arg):
+        return NotImplemented
+
+
+class SimPsu(SimInstrument):
+    """E36313A subset: channel select, VOLT/CURR, OUTP, list mode with trigger out."""
+    idn = "Keysight Technologies,E36313A,SIM00001,1.0.0-sim"
+
+    def __init__(self, *args, index=0):
+        super().__init__(*args)
+        self.index = index
+        self.current_limit = {1: 1.0, 2: 1.0, 3: 1.0}
+        self.list_volt = []
+        self.list_armed = False
+
+    def _channels(self, channels):
+        """Channels a command applies to: its (@...) list, else the selected one."""
+        return channels or [self.bench.selected[self.index]]
+
+    def _handle_specific(self, header, arg):
+        bench = self.bench
+        value, channels = parse_channel_list(arg)
+        if channels and any(ch not in self.current_limit for ch in channels):
+            self._error('-222,"Data out of range"')
+            return None
+        if header in ("INST:NSEL", "INSTRUMENT:NSELECT"):
+            channel = int(float(arg))
+            if channel not in self.current_limit:
+                self._error('-222,"Data out of range"')
+            else:
+                bench.selected[self.index] = channel
+            return None
+        if header in ("VOLT", "VOLTAGE"):
+            for ch in self._channels(channels):
+                bench.set_output(self.index, ch, float(value))
+            return None
+        if header in ("CURR", "CURRENT"):
+            for ch in self._channels(channels):
+                self.current_limit[ch] = float(value)
+            return None
+        if header in ("OUTP", "OUTPUT"):
+            for ch in self._channels(channels):
+                bench.set_enabled(self.index, ch, value.upper() in ("ON", "1"))
+            return None
+        if header in ("MEAS:VOLT?", "MEASURE:VOLTAGE?"):
+            out = bench.outputs[self.index][self._channels(channels)[0]]
+            return out.setpoint if out.on else 0.0
+        if header in ("MEAS:CURR?", "MEASURE:CURRENT?"):
+            return 0.0
+        if header == "LIST:VOLT":
+            self.list_volt = [float(v) for v in arg.split(",")]
+            return None
+        if header in ("LIST:DWEL", "LIST:TOUT:BOST", "LIST:COUN", "LIST:STEP", "LIST:TERM:LAST",
+                      "VOLT:MODE", "TRIG:SOUR"):
+            return None
+        if header == "INIT":
+            self.list_armed = True
+            return None
+        if header == "*TRG":
+            if self.list_armed:
+                # The list runs instantly in simulated time; each step fires the trigger output
+                channel = bench.selected[self.index]
+                # Trigger out reaches the DMMs measuring this PSU (all of them when unwired)
+                dmms = [dmm for i, dmm in bench.dmms.items() if bench.source_of(i)[0] == self.index]
+                for v in self.list_volt:
+                    bench.set_output(self.index, channel, v)
+                    for dmm in dmms:
+                        dmm.external_trigger()
+                self.list_armed = False
+            return None
+        if header == "ABOR":
+            self.list_armed = False
+            return None
+        return NotImplemented
+
+
+class SimDmm(SimInstrument):
+    """EDU34450A subset: CONF:VOLT:DC (and CURR:DC, RES, FRES), READ?/INIT/FETC?, sample and trigger counts, REAL,64 format.
+
+    Every function reads the DUT output, so current and resistance sweeps run
+    the same code paths as voltage ones.
+    """
+    idn = "Keysight Technologies,EDU34450A,SIM00002,1.0.0-sim"
+
+    def __init__(self, *args, index=0, binary_support=True):
+        super().__init__(*args)
+        self.index = index
+        self.route = None # ROUT:CLOS channel on a scanner DMM
+        self.binary_support = binary_support
+        self.binary = False
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = "IMM"
+        self.nplc = 10.0
+        self.memory = []
+        self.bench.dmms[index] = self
+
+    def external_trigger(self):
+        if self.trigger_source == "EXT" and len(self.memory) < self.trigger_count * self.sample_count:
+            self.memory.extend(self.bench.dut_voltage(self.sample_count, dmm=self.index, route=self.route).tolist())
+
+    def _acquire(self):
+        # Readings are one integration time apart (50 Hz line)
+        return self.bench.dut_voltage(self.sample_count * self.trigger_count, self.nplc / 50,
+                                      dmm=self.index, route=self.route).tolist()
+
+    def _readings(self):
+        readings, self.memory = self.memory, []
+        if self.binary:
+            return readings
+        return ",".join(f"{v:+.9E}" for v in readings)
+
+    def _handle_specific(self, header, arg):
+        if header in ("CONF:VOLT:DC", "CONFIGURE:VOLTAGE:DC", "CONF:CURR:DC", "CONFIGURE:CURRENT:DC",
+                      "CONF:RES", "CONFIGURE:RESISTANCE", "CONF:FRES", "CONFIGURE:FRESISTANCE"):
+            self.nplc = 10.0
+            self.sample_count = 1
+            self.trigger_count = 1
+            self.trigger_source = "IMM"
+            return None
+        if header in ("VOLT:IMP:AUTO", "TRIG:DEL", "TRIG:DEL:AUTO"):
+            return None
+        if header in ("VOLT:DC:NPLC", "VOLTAGE:DC:NPLC", "CURR:DC:NPLC", "RES:NPLC", "FRES:NPLC"):
+            self.nplc = float(arg)
+            return None
+        if header in ("VOLT:DC:NPLC?", "VOLTAGE:DC:NPLC?", "CURR:DC:NPLC?", "RES:NPLC?", "FRES:NPLC?"):
+            return self.nplc
+        if header in ("SAMP:COUN", "SAMPLE:COUNT"):
+            self.sample_count = int(float(arg))
+            return None
+        if header in ("TRIG:COUN", "TRIGGER:COUNT"):
+            self.trigger_count = int(float(arg))
+            return None
+        if header in ("TRIG:SOUR", "TRIGGER:SOURCE"):
+            self.trigger_source = arg.strip().upper()
+            return None
+        if header in ("FORM:DATA", "FORMAT:DATA"):
+            if not self.binary_support:
+                return NotImplemented
+            self.binary = arg.replace(" ", "").upper().startswith("REAL")
+            return None
+        if header == "INIT":
+            self.memory = []
+            if self.trigger_source == "IMM":
+                self.memory = self._acquire()
+            return None
+        if header == "ABOR":
+            return None
+        if header in ("ROUT:CLOS", "ROUTE:CLOSE", "ROUT:CLOS:EXCL", "ROUTE:CLOSE:EXCLUSIVE") and isinstance(self.bench.wiring.get(self.index), dict):
+            self.route = parse_channel_list(arg)[1][0]
+            return None
+        if header in ("FETC?", "FETCH?"):
+            return self._readings()
+        if header == "READ?":
+            self.memory = self._acquire()
+            return self._readings()
+        return NotImplemented
+
+
+class SimResourceManager:
+    """Drop-in for pyvisa.ResourceManager exposing simulated PSUs and DMMs.
+
+    latency maps a SCPI header (e.g. "READ?", "VOLT") to seconds per
+    transfer, with "default" for everything else. The instruments are at
+    sim_psu_address(i) / sim_dmm_address(i); see SimBench for wiring.
+    """
+
+    def __init__(self, latency=None, dut=divider_dut, noise=0.0, settle_tau=0.0, dmm_binary=True,
+                 psu_count=1, dmm_count=1, wiring=None):
+        self.latency = dict(latency or {})
+        self.bench = SimBench(dut=dut, noise=noise, settle_tau=settle_tau, psu_count=psu_count, wiring=wiring)
+        self.dmm_binary = dmm_binary
+        self.psu_addresses = [sim_psu_address(i) for i in range(psu_count)]
+        self.dmm_addresses = [sim_dmm_address(i) for i in range(dmm_count)]
+        self.opened = [] # Every session handed out, for inspecting counts/busy_time
+        self._locks = {}
+
+    def list_resources(self, query="?*::INSTR"):
+        return tuple(self.psu_addresses + self.dmm_addresses)
+
+    def open_resource(self, resource_name, **kwargs):
+        # Sessions to the same address share a lock, like one physical instrument
+        lock = self._locks.setdefault(resource_name, threading.Lock())
+        if resource_name in self.psu_addresses:
+            session = SimPsu(resource_name, self.bench, self.latency, lock,
+                             index=self.psu_addresses.index(resource_name))
+        elif resource_name in self.dmm_addresses:
+            session = SimDmm(resource_name, self.bench, self.latency, lock,
+                             index=self.dmm_addresses.index(resource_name), binary_support=self.dmm_binary)
+        else:
+            raise ValueError(f"Unknown simulated resource: {resource_name}")
+        self.opened.append(session)
+        return session
+
+    def close(self):
+        pass
+
+
+def simulated_rack(channels):
+    """Re-point a multi-channel spec at simulated instruments.
+
+    channels is a list of ChannelMap-style dicts. Each distinct PSU and DMM
+    address is replaced by a simulated one, and the DMMs are wired to the
+    channels they measure. Returns (channels, SimResourceManager).
+    """
+    psus = list(dict.fromkeys(c["psu_address"] for c in channels))
+    dmms = list(dict.fromkeys(c["dmm_address"] for c in channels))
+    wiring = {}
+    result = []
+    for c in channels:
+        dmm = dmms.index(c["dmm_address"])
+        source = (psus.index(c["psu_address"]), int(c["channel"]))
+        if c.get("dmm_route"):
+            wiring.setdefault(dmm, {})[parse_channel_list(c["dmm_route"])[1][0]] = source
+        else:
+            wiring[dmm] = source
+        result.append(dict(c, psu_address=sim_psu_address(source[0]), dmm_address=sim_dmm_address(dmm)))
+    return result, SimResourceManager(psu_count=len(psus), dmm_count=len(dmms), wiring=wiring)
@@ -0,0 +1,1232 @@
+"""PSU/DMM sweep engine, usable without the Tk front end.
+
+Library use:
+    config = SweepConfig(psu_address="USB0::...", dmm_address="USB0::...", stop_voltage=2.0)
+    result = SweepRun(config, pyvisa.ResourceManager()).run()
+
+Command line, with a JSON (or YAML, needs PyYAML) run spec whose keys are
+SweepConfig fields:
+    python -m sweep_engine run.json [--output data.npy] [--backend @py] [--simulate] [--trace trace.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Optional
+
+import numpy as np
+
+import data_sinks
+import drivers
+import session_pool
+import setpoints
+import visa_trace
+
+# Standard Event Status bits that indicate a SCPI error:
+# QYE (2), DDE (3), EXE (4), CME (5)
+ESE_ERROR_MASK = 0x3C
+# Status Byte bits that flag pending errors: EAV (2) and ESB (5)
+STB_ERROR_MASK = 0x24
+
+# For estimating how long a DMM reading takes: NPLC left by CONF on Keysight
+# DMMs, and the slower mains rate so the estimate also holds on 60 Hz
+DEFAULT_NPLC = 10
+LINE_FREQUENCY = 50
+
+# Wall clock anchor for the monotonic clock, so sample timestamps are epoch
+# based but never jump if the system clock is adjusted during a run
+_EPOCH_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def timestamp_ns():
+    """Epoch timestamp in ns derived from the monotonic clock."""
+    return _EPOCH_OFFSET_NS + time.monotonic_ns()
+
+
+class ListModeNotSupported(Exception):
+    """Raised when the PSU or DMM rejects the list/trigger setup."""
+
+
+@dataclass
+class SweepStats:
+    """Counters returned by a sweep loop."""
+    steps_done: int = 0
+    overhead_total: float = 0.0 # Seconds spent outside the settle time
+    settle_total: float = 0.0 # Seconds spent settling
+    ok: bool = True # False if the sweep was stopped by an instrument error
+
+    @property
+    def overhead_per_step(self):
+        return self.overhead_total / self.steps_done if self.steps_done else 0.0
+
+
+SWEEP_MODES = ("stepped", "concurrent", "list", "adaptive", "continuous")
+
+# linear: start_voltage to stop_voltage in step_voltage steps, log: points_per_decade,
+# segments: piecewise linear, file: setpoint_file
+SETPOINT_SOURCES = ("linear", "log", "segments", "file")
+
+
+@dataclass
+class ChannelMap:
+    """One PSU channel and the DMM (or scanner channel) that measures it."""
+    psu_address: str
+    channel: int
+    dmm_address: str
+    label: str = "" # Column name suffix, defaults to PSU<n>_CH<channel>
+    dmm_route: Optional[str] = None # Scanner channel list for ROUT:CLOS, e.g. "(@101)"
+
+
+@dataclass
+class SweepConfig:
+    """Everything needed to run one sweep, in plain Python types.
+
+    Single channel runs use psu_address / channel / dmm_address. For a rack,
+    channels lists ChannelMap entries (or dicts with the same keys) and the
+    three single channel fields are ignored.
+    """
+    psu_address: str = ""
+    dmm_address: str = ""
+    output_file: str = "measurements.csv"
+    start_voltage: float = 0.0
+    stop_voltage: float = 5.0
+    step_voltage: float = 0.5 # Finest spacing in adaptive mode
+    setpoint_source: str = "linear" # One of SETPOINT_SOURCES, how the setpoints are generated
+    points_per_decade: float = 10 # Log setpoints: points per factor of 10 from start to stop
+    segments: Optional[list] = None # Piecewise setpoints: [[start, stop, step], ...]
+    setpoint_file: str = "" # File setpoints: .csv/.txt/.npy read while the sweep runs
+    current_limit: float = 1.0 # Amps
+    settle_time: float = 0.5 # Seconds
+    channel: int = 1
+    high_impedance: bool = True # DC volts: >10 GΩ input on the low ranges where the DMM has it
+    measurement: str = "volt_dc" # One of drivers.MEASUREMENTS, what the DMM measures
+    psu_profile: str = "" # drivers.PsuProfile name, "" = picked by the PSU's *IDN? model
+    dmm_profile: str = "" # drivers.DmmProfile name, "" = picked by the DMM's *IDN? model
+    samples_per_point: int = 1 # DMM readings averaged per setpoint
+    nplc: Optional[float] = None # None = instrument default
+    sweep_mode: str = "stepped" # One of SWEEP_MODES
+    error_check_interval: int = 25 # Poll the PSU status byte every N steps
+    list_measure_window: float = 0.1 # List mode: time per step for the DMM readings, on top of the settle (raised to fit samples x NPLC)
+    adaptive_coarse_factor: int = 16 # Adaptive mode: first pass measures every Nth step
+    adaptive_tolerance: float = 0.005 # Adaptive mode: refine where readings deviate from linear by more (V)
+    adaptive_max_points: int = 2000 # Adaptive mode: hard limit on points measured
+    writer_queue_size: int = 65536 # Output ring buffer rows
+    writer_policy: str = "block" # "block" or "drop" when the ring is full
+    settle_mode: str = "fixed" # "fixed" sleeps settle_time, "auto" watches the DMM (settle_time is the timeout)
+    settle_tolerance: float = 0.001 # Auto settle: how far (in the reading unit) the means of consecutive bursts may differ
+    settle_samples: int = 3 # Auto settle: readings averaged per settle burst
+    settle_nplc: float = 0.02 # Auto settle: fast integration time for the settle bursts
+    trace_commands: bool = True # Time every VISA write/query (see visa_trace)
+    trace_file: Optional[str] = None # Chrome trace JSON written after the run
+    channels: Optional[list] = None # ChannelMap entries for multi-channel sweeps
+    resume: bool = False # Append to an existing output file, skipping the setpoints already in it
+    checkpoint: bool = False # Write and fsync every point as it is taken, so a resume loses nothing (.csv/.npy)
+    sample_rate: float = 1.0 # Continuous mode: samples per second at start_voltage
+    duration: float = 0.0 # Continuous mode: seconds to log, 0 = until stopped
+    log_psu: bool = True # Continuous mode: also log the PSU's MEAS:VOLT? / MEAS:CURR? readback
+    rotate_mb: float = 0.0 # Continuous mode: start a new numbered file past this size, 0 = never
+    rotate_hours: float = 0.0 # Continuous mode: start a new numbered file after this long, 0 = never
+    analyze: bool = True # Write an error/linearity summary next to the output file (see analysis)
+    outlier_sigma: float = 6.0 # Analysis: flag readings this many robust sigmas off the fitted line
+
+    @classmethod
+    def from_dict(cls, data):
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown run spec keys: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def validate(self):
+        if self.channels:
+            if self.sweep_mode not in ("stepped", "concurrent"):
+                raise ValueError("Multi-channel sweeps support the stepped and concurrent modes only")
+            maps = self.channel_maps()
+            if len({c.label for c in maps}) != len(maps):
+                raise ValueError("Channel labels must be unique")
+            routes = [(c.dmm_address, c.dmm_route) for c in maps]
+            if len(set(routes)) != len(routes):
+                raise ValueError("Channels measured by the same DMM need different dmm_route values")
+        elif not self.psu_address or not self.dmm_address:
+            raise ValueError("psu_address and dmm_address are required")
+        if self.step_voltage <= 0:
+            raise ValueError("Step size must be positive")
+        if self.setpoint_source not in SETPOINT_SOURCES:
+            raise ValueError(f"setpoint_source must be one of {', '.join(SETPOINT_SOURCES)}")
+        if self.sweep_mode == "adaptive" and self.setpoint_source != "linear":
+            raise ValueError("Adaptive sweeps refine a linear grid, use setpoint_source 'linear'")
+        if self.setpoint_source == "segments" and not self.segments:
+            raise ValueError("segments needs at least one [start, stop, step] entry")
+        if not len(self.voltages()): # Also checks the source's own parameters
+            raise ValueError("The setpoint source has no points")
+        if self.measurement not in drivers.MEASUREMENTS:
+            raise ValueError(f"measurement must be one of {', '.join(drivers.MEASUREMENTS)}")
+        # Unknown profile names raise here rather than after connecting
+        drivers.psu_profile_for("", self.psu_profile)
+        if self.dmm_profile:
+            drivers.dmm_profile_for("", self.dmm_profile).function(self.measurement)
+        if self.sweep_mode not in SWEEP_MODES:
+            raise ValueError(f"sweep_mode must be one of {', '.join(SWEEP_MODES)}")
+        if self.writer_policy not in ("block", "drop"):
+            raise ValueError("writer_policy must be 'block' or 'drop'")
+        if self.error_check_interval < 1:
+            raise ValueError("error_check_interval must be at least 1")
+        if self.writer_queue_size < 1:
+            raise ValueError("writer_queue_size must be at least 1")
+        if self.settle_mode not in ("fixed", "auto"):
+            raise ValueError("settle_mode must be 'fixed' or 'auto'")
+        if self.settle_mode == "auto" and self.settle_tolerance <= 0:
+            raise ValueError("Settle tolerance must be positive")
+        if self.resume and self.sweep_mode in ("adaptive", "continuous"):
+            raise ValueError(f"{self.sweep_mode.capitalize()} runs can't be resumed")
+        if self.sweep_mode == "continuous":
+            if self.channels:
+                raise ValueError("Continuous logging supports a single channel")
+            if self.setpoint_source != "linear":
+                raise ValueError("Continuous logging holds start_voltage, use setpoint_source 'linear'")
+            if self.sample_rate <= 0:
+                raise ValueError("Sample rate must be positive")
+            if self.duration < 0 or self.rotate_mb < 0 or self.rotate_hours < 0:
+                raise ValueError("Duration and rotation limits can't be negative")
+        if self.sweep_mode == "adaptive" and self.adaptive_tolerance <= 0:
+            raise ValueError("Adaptive tolerance must be positive")
+
+    def channel_maps(self):
+        """The channels to sweep as ChannelMap entries, with default labels filled in."""
+        if not self.channels:
+            return [ChannelMap(self.psu_address, self.channel, self.dmm_address, label=f"CH{self.channel}")]
+        maps = [c if isinstance(c, ChannelMap) else ChannelMap(**c) for c in self.channels]
+        psus = list(dict.fromkeys(c.psu_address for c in maps))
+        for c in maps:
+            if not c.label:
+                c.label = f"PSU{psus.index(c.psu_address) + 1}_CH{c.channel}"
+        return maps
+
+    def resumable(self):
+        """Whether a run of this config can pick up an existing output file (see resume)."""
+        return (self.sweep_mode not in ("adaptive", "continuous")
+                and data_sinks.sink_type(data_sinks.output_path(self.output_file)).resumable)
+
+    def step_count(self):
+        """Points in the sweep, an upper bound in adaptive mode. Counted without generating them.
+
+        Continuous mode: samples over the duration, 0 if it logs until stopped.
+        """
+        if self.sweep_mode == "continuous":
+            return int(self.duration * self.sample_rate)
+        return len(self.voltages())
+
+    def voltages(self):
+        """Setpoints in sweep order, as a setpoints.SetpointSource (AdaptivePlanner in adaptive mode)."""
+        if self.sweep_mode == "adaptive":
+            return setpoints.AdaptivePlanner(
+                self.start_voltage, self.stop_voltage, self.step_voltage,
+                coarse_factor=self.adaptive_coarse_factor,
+                tolerance=self.adaptive_tolerance,
+                max_points=self.adaptive_max_points,
+            )
+        if self.setpoint_source == "log":
+            return setpoints.LogSetpoints(self.start_voltage, self.stop_voltage, self.points_per_decade)
+        if self.setpoint_source == "segments":
+            return setpoints.PiecewiseSetpoints(self.segments or [])
+        if self.setpoint_source == "file":
+            return setpoints.FileSetpoints(self.setpoint_file)
+        return setpoints.LinearSetpoints(self.start_voltage, self.stop_voltage, self.step_voltage)
+
+
+def _noop(*args):
+    pass
+
+
+def check_instrument_errors(instrument, instrument_name, log):
+    """Check for SCPI errors in the instrument's error queue."""
+    try:
+        try: # Wait for operation to complete before checking errors
+            instrument.query("*OPC?") # IEEE-488 standard command that guarantees that commands previously sent to the instrument have completed
+        except Exception:
+            # If *OPC? not supported, small delay
+            time.sleep(0.05)
+
+        while True:
+            error_response = instrument.query("SYST:ERR?").strip()
+            # +0,"No error" means no errors in queue
+            if error_response.startswith("+0,") or error_response.startswith("0,"):
+                break  # No more errors
+            else:
+                # Log the error
+                log(f"⚠️ {instrument_name} Error: {error_response}")
+                return False  # False = errors found
+        return True  # True = no errors
+    except Exception as e:
+        # If not support SYST:ERR?, just log and continue
+        log(f"Could not query {instrument_name} errors: {e}")
+        return True
+
+
+def enable_error_status(instrument):
+    """Clear status and route SCPI error events to the status byte (ESB bit)."""
+    try:
+        instrument.write("*CLS")
+        instrument.write(f"*ESE {ESE_ERROR_MASK}")
+    except Exception:
+        pass  # Ignore if not supported, poll_instrument_errors falls back
+
+
+def poll_instrument_errors(instrument, instrument_name, log):
+    """Cheap error check: one *STB? query, only drains SYST:ERR? if an error bit is set."""
+    try:
+        stb = int(float(instrument.query("*STB?")))
+    except Exception:
+        # No status byte support, fall back to a full error queue check
+        return check_instrument_errors(instrument, instrument_name, log)
+
+    if not stb & STB_ERROR_MASK:
+        return True  # True = no errors
+
+    ok = check_instrument_errors(instrument, instrument_name, log)
+    clear_instrument_errors(instrument)
+    try:
+        instrument.write("*CLS") # Reset event register so ESB doesn't stay latched
+    except Exception:
+        pass
+    return ok
+
+
+def clear_instrument_errors(instrument):
+    """Clear all errors from the instrument's error queue without logging them."""
+    try:
+        # Clear error queue by reading until empty
+        while True:
+            error_response = instrument.query("SYST:ERR?").strip()
+            if error_response.startswith("+0,") or error_response.startswith("0,"):
+                break
+    except Exception:
+        pass  # Ignore if not supported
+
+
+def parse_reading(response):
+    try:
+        return float(response)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def parse_readings(response):
+    """Parse a comma separated reading list (READ?/FETC? with SAMP:COUN > 1) into a float64 array."""
+    return np.fromstring(response, dtype=np.float64, sep=",")
+
+
+def parse_binary_block(block, out=None):
+    """Parse an IEEE-488.2 definite-length block of REAL,64 (big endian) values.
+
+    The values are viewed straight from the buffer, no per-value Python
+    objects. If out is given they are copied into it and out[:n] is returned.
+    """
+    block = memoryview(block)
+    start = bytes(block[:1024]).index(b"#")
+    digits = int(bytes(block[start + 1:start + 2]))
+    if digits == 0:
+        raise ValueError("Indefinite-length blocks are not supported")
+    length = int(bytes(block[start + 2:start + 2 + digits]))
+    offset = start + 2 + digits
+    values = np.frombuffer(block[offset:offset + length], dtype=">f8")
+    if out is None:
+        return values
+    n = values.size
+    out[:n] = values
+    return out[:n]
+
+
+def enable_binary_readings(instrument, instrument_name, log):
+    """Switch reading transfers to REAL,64 binary blocks. Returns False (and stays ASCII) if unsupported."""
+    try:
+        instrument.write("FORM:DATA REAL,64")
+    except Exception:
+        return False
+    if check_instrument_errors(instrument, instrument_name, _noop):
+        log(f"{instrument_name} readings use REAL,64 binary transfer")
+        return True
+    clear_instrument_errors(instrument)
+    instrument.write("*CLS")
+    log(f"{instrument_name} has no binary format, using ASCII readings")
+    return False
+
+
+class ReadingBuffer:
+    """Preallocated float64 array that binary reading blocks are parsed into.
+
+    One per reader, reused for every point so bulk transfers don't allocate a
+    new array each time. It only grows (doubling) when a block holds more
+    values than it has room for.
+    """
+
+    def __init__(self, size=1024):
+        self._data = np.empty(size)
+
+    def store(self, values):
+        """Copy values (any float dtype/byte order) in, return the filled part as a view."""
+        n = len(values)
+        if n > self._data.size:
+            self._data = np.empty(max(n, 2 * self._data.size))
+        out = self._data[:n]
+        out[...] = values
+        return out
+
+
+def query_readings(instrument, command, binary=False, buffer=None):
+    """Query a reading list, as a REAL,64 block if binary else as ASCII.
+
+    With a ReadingBuffer the binary block is byte-swapped straight into it and
+    a view of the buffer is returned, only valid until its next use.
+    """
+    if binary:
+        values = instrument.query_binary_values(command, datatype="d", is_big_endian=True, container=np.array)
+        return values if buffer is None else buffer.store(values)
+    return parse_readings(instrument.query(command))
+
+
+def configure_dmm_sampling(dmm, samples=1, nplc=None, nplc_header="VOLT:DC:NPLC"):
+    """Arm the DMM so one trigger takes `samples` readings into its reading memory.
+
+    nplc_header is the integration time command of the measurement function
+    (drivers.MeasureFunction.nplc).
+    """
+    if nplc is not None:
+        dmm.write(f"{nplc_header} {nplc}")
+    dmm.write("TRIG:SOUR IMM")
+    dmm.write("TRIG:COUN 1")
+    dmm.write(f"SAMP:COUN {samples}")
+
+
+def read_dmm_samples(dmm, binary=False, buffer=None):
+    """Trigger one burst and pull every reading back in a single transfer."""
+    return query_readings(dmm, "READ?", binary, buffer)
+
+
+def fetch_dmm_samples(dmm, binary=False, buffer=None):
+    """Fetch the readings of a burst already triggered (INIT), e.g. by an external trigger."""
+    return query_readings(dmm, "FETC?", binary, buffer)
+
+
+def make_dmm_reader(dmm, samples=1, binary=False, buffered=True):
+    """Return a callable that takes one measurement point from the DMM.
+
+    With samples > 1 the DMM must be armed with configure_dmm_sampling, the
+    point is then the mean of the whole burst. binary must match the DMM's
+    FORM:DATA setting (see enable_binary_readings). A DMM without a reading
+    buffer (buffered=False) is queried samples times instead.
+    """
+    if samples <= 1 and not binary:
+        # READ? configures and measures. MEAS? is higher level.
+        return lambda: parse_reading(dmm.query("READ?"))
+
+    if not buffered:
+        def read_each():
+            return float(np.mean([parse_reading(dmm.query("READ?")) for _ in range(samples)]))
+        return read_each
+
+    buffer = ReadingBuffer(samples)
+
+    def read_average():
+        readings = read_dmm_samples(dmm, binary, buffer)
+        return float(readings.mean()) if readings.size else float('nan')
+    return read_average
+
+
+class AutoSettle:
+    """Settle by watching the DMM instead of sleeping a fixed time.
+
+    After each setpoint change the DMM takes bursts of stable_samples
+    readings at fast_nplc until the means of two consecutive bursts differ by
+    no more than tolerance (in the measurement's unit), or timeout seconds
+    have passed. The DMM is then put back to final_nplc and `samples`
+    readings per trigger for the real measurement. Needs a DMM with a reading
+    buffer. Use as the settle callable of run_serial_sweep /
+    run_concurrent_sweep.
+    """
+
+    def __init__(self, dmm, tolerance, timeout, stable_samples=3, fast_nplc=0.02,
+                 final_nplc=None, samples=1, binary=False, nplc_header="VOLT:DC:NPLC", log=print):
+        self.dmm = dmm
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.stable_samples = max(2, stable_samples)
+        self.binary = binary
+        self._buffer = ReadingBuffer(self.stable_samples)
+        self._fast = f"{nplc_header} {fast_nplc};:SAMP:COUN {self.stable_samples}"
+        self._final = f"SAMP:COUN {samples}"
+        if final_nplc is None:
+            try:
+                final_nplc = float(dmm.query(f"{nplc_header}?")) # Restore whatever the DMM was set to
+            except Exception as e:
+                log(f"⚠️ Could not read the DMM integration time ({e}), it stays at NPLC {fast_nplc:g} after settling")
+        if final_nplc is not None:
+            self._final = f"{nplc_header} {final_nplc};:{self._final}"
+        self.timeouts = 0 # Points that hit the timeout without settling
+
+    def __call__(self):
+        deadline = time.perf_counter() + self.timeout
+        self.dmm.write(self._fast)
+        try:
+            previous = None
+            while True:
+                readings = read_dmm_samples(self.dmm, self.binary, self._buffer)
+                mean = float(readings.mean()) if readings.size == self.stable_samples else None
+                # A single quiet burst can still sit on a slow ramp, so compare it with the one before
+                if mean is not None and previous is not None and abs(mean - previous) <= self.tolerance:
+                    return
+                previous = mean
+                if time.perf_counter() >= deadline:
+                    self.timeouts += 1
+                    return
+        finally:
+            self.dmm.write(self._final)
+
+
+def run_serial_sweep(psu, dmm, voltages, settle_t, on_step, should_continue, log,
+                     error_check_interval=25, on_settle=_noop, measure=None, settle=None,
+                     voltage_command=None):
+    """Drive the PSU and DMM one after the other on the calling thread.
+
+    on_step(idx, v_set, v_read, t_ns, settle_s) is called after every
+    measurement and should_continue() before every step. measure() takes the
+    reading and defaults to a single READ?. settle() waits for the output to
+    settle and defaults to sleeping settle_t (see AutoSettle).
+    voltage_command(v) is the PSU write for a setpoint, "VOLT <v>" by default
+    (see drivers.PsuProfile.voltage_command).
+    """
+    stats = SweepStats()
+    measure = measure or make_dmm_reader(dmm)
+    settle = settle or (lambda: time.sleep(settle_t))
+    voltage_command = voltage_command or drivers.GENERIC_PSU.voltage_command
+
+    for idx, v_set in enumerate(voltages):
+        if not should_continue():
+            break
+
+        step_start = time.perf_counter()
+
+        # Set Voltage
+        psu.write(voltage_command(v_set))
+
+        # Deferred error check: poll the status byte every N steps instead of *OPC? + SYST:ERR? per write
+        if (idx + 1) % error_check_interval == 0:
+            if not poll_instrument_errors(psu, "PSU", log):
+                # Error occurred somewhere in the last interval, stop the sweep
+                log(f"⚠️ Stopping due to PSU error at or before {v_set:.3f}V")
+                stats.ok = False
+                break
+
+        # Settle
+        on_settle(v_set)
+        settle_start = time.perf_counter()
+        settle()
+        settle_actual = time.perf_counter() - settle_start
+
+        # Measure
+        v_read = measure()
+        on_step(idx, v_set, v_read, timestamp_ns(), settle_actual)
+
+        # Everything except the settle counts as per-step overhead
+        stats.overhead_total += (time.perf_counter() - step_start) - settle_actual
+        stats.settle_total += settle_actual
+        stats.steps_done += 1
+
+    # Final error check covers the steps since the last poll
+    if stats.ok and not poll_instrument_errors(psu, "PSU", log):
+        log("⚠️ PSU reported errors during the final steps of the sweep")
+
+    return stats
+
+
+def run_concurrent_sweep(psu, dmm, voltages, settle_t, on_step, should_continue, log,
+                         error_check_interval=25, on_settle=_noop, measure=None, settle=None,
+                         voltage_command=None):
+    """Same sweep as run_serial_sweep, with one I/O worker thread per instrument.
+
+    The physical order set -> settle -> measure is kept for every point, but
+    the PSU error poll runs during the settle and the next VOLT write is issued
+    as soon as the DMM reading is in, overlapping with on_step bookkeeping
+    (CSV write, UI update) on the calling thread.
+    """
+    stats = SweepStats()
+    measure = measure or make_dmm_reader(dmm)
+    settle = settle or (lambda: time.sleep(settle_t))
+    voltage_command = voltage_command or drivers.GENERIC_PSU.voltage_command
+    # Streamed with one point of lookahead, the next setpoint is written early
+    upcoming = iter(voltages)
+    v_next = next(upcoming, None)
+    if v_next is None:
+        return stats
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="psu-io") as psu_io, \
+         ThreadPoolExecutor(max_workers=1, thread_name_prefix="dmm-io") as dmm_io:
+        pending_set = psu_io.submit(psu.write, voltage_command(v_next))
+
+        idx = -1
+        while v_next is not None:
+            idx += 1
+            v_set = v_next
+            v_next = next(upcoming, None)
+            if not should_continue():
+                break
+
+            step_start = time.perf_counter()
+
+            # The PSU must be at the setpoint before the settle starts
+            pending_set.result()
+            pending_err = None
+            if (idx + 1) % error_check_interval == 0:
+                pending_err = psu_io.submit(poll_instrument_errors, psu, "PSU", log)
+
+            # Settle
+            on_settle(v_set)
+            settle_start = time.perf_counter()
+            settle()
+            settle_actual = time.perf_counter() - settle_start
+
+            # Measure
+            v_read = dmm_io.submit(measure).result()
+            t_ns = timestamp_ns()
+
+            if pending_err is not None and not pending_err.result():
+                log(f"⚠️ Stopping due to PSU error at or before {v_set:.3f}V")
+                stats.ok = False
+                break
+
+            # Queue the next setpoint so it goes out while this point is being recorded
+            if v_next is not None:
+                pending_set = psu_io.submit(psu.write, voltage_command(v_next))
+
+            on_step(idx, v_set, v_read, t_ns, settle_actual)
+
+            stats.overhead_total += (time.perf_counter() - step_start) - settle_actual
+            stats.settle_total += settle_actual
+            stats.steps_done += 1
+
+        # Final error check covers the steps since the last poll
+        if stats.ok and not psu_io.submit(poll_instrument_errors, psu, "PSU", log).result():
+            log("⚠️ PSU reported errors during the final steps of the sweep")
+
+    return stats
+
+
+def _wait_interruptible(duration, should_continue, poll=0.05):
+    """Sleep for duration seconds, returning False early if should_continue() goes False."""
+    deadline = time.perf_counter() + duration
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if not should_continue():
+            return False
+        time.sleep(min(poll, remaining))
+
+
+def _format_list(values):
+    return ",".join(f"{v:.6g}" for v in values)
+
+
+def run_list_sweep(psu, dmm, voltages, settle_t, on_step, should_continue, log,
+                   samples=1, measure_window=0.1, max_list_points=100, binary=False):
+    """Run the sweep on-instrument using the PSU list mode.
+
+    Each chunk of up to max_list_points setpoints is uploaded with one set of
+    LIST commands and started with a single *TRG. The PSU trigger output
+    fires at the start of every step and triggers the DMM (TRIG:SOUR EXT,
+    TRIG:DEL = settle time), so the host only fetches the buffered readings
+    once the chunk is done. Each step dwells for settle_t + measure_window,
+    which must cover the `samples` readings taken on each trigger.
+
+    Raises ListModeNotSupported if either instrument rejects the setup of the
+    first chunk, before anything is measured. A later chunk being rejected
+    stops the sweep with stats.ok False instead, falling back then would
+    measure the finished chunks a second time.
+    """
+    stats = SweepStats()
+    upcoming = iter(voltages)
+    dwell = settle_t + measure_window
+    buffer = ReadingBuffer(max_list_points * samples)
+
+    def configure(instrument, name, commands):
+        """Send commands, False if the instrument reported an error."""
+        for command in commands:
+            instrument.write(command)
+        if check_instrument_errors(instrument, name, log):
+            return True
+        # Leave the error/status registers clean for a stepped fallback
+        clear_instrument_errors(instrument)
+        instrument.write("*CLS")
+        return False
+
+    try:
+        chunk_start = 0
+        while True:
+            if not should_continue():
+                break
+
+            # Only one chunk of setpoints is held at a time
+            chunk = list(itertools.islice(upcoming, max_list_points))
+            n = len(chunk)
+            if not n:
+                break
+            chunk_t0 = time.perf_counter()
+
+            rejected = None
+            if not configure(psu, "PSU", [
+                f"LIST:VOLT {_format_list(chunk)}",
+                f"LIST:DWEL {_format_list([dwell] * n)}",
+                f"LIST:TOUT:BOST {','.join(['1'] * n)}", # Trigger out at the beginning of each step
+                "LIST:COUN 1",
+                "LIST:STEP AUTO",
+                "LIST:TERM:LAST ON", # Hold the last list value instead of jumping back
+                "VOLT:MODE LIST",
+                "TRIG:SOUR BUS",
+            ]):
+                rejected = "PSU"
+            elif not configure(dmm, "DMM", [
+                "TRIG:SOUR EXT",
+                f"TRIG:DEL {settle_t:.6g}",
+                f"TRIG:COUN {n}",
+                f"SAMP:COUN {samples}",
+            ]):
+                rejected = "DMM"
+            if rejected:
+                if not chunk_start:
+                    # Nothing measured yet, the whole sweep can still run stepped
+                    raise ListModeNotSupported(f"{rejected} rejected list/trigger setup")
+                log(f"⚠️ {rejected} rejected the list setup for points {chunk_start + 1}-{chunk_start + n}, stopping")
+                stats.ok = False
+                break
+
+            # Arm both, then a single trigger runs the whole chunk
+            dmm.write("INIT")
+            psu.write("INIT")
+            started_ns = timestamp_ns()
+            psu.write("*TRG")
+
+            if not _wait_interruptible(n * dwell, should_continue):
+                psu.write("ABOR")
+                dmm.write("ABOR")
+                log("List sweep aborted, readings of the current chunk discarded")
+                break
+
+            psu.query("*OPC?")
+            readings = fetch_dmm_samples(dmm, binary, buffer)
+
+            # One row per step, averaging the samples taken on each trigger
+            points = np.full(n, np.nan)
+            usable = min(readings.size // samples, n)
+            if usable:
+                points[:usable] = readings[:usable * samples].reshape(usable, samples).mean(axis=1)
+            if usable < n:
+                log(f"⚠️ DMM returned {readings.size} readings, expected {n * samples}")
+
+            for i, (v_set, v_read) in enumerate(zip(chunk, points)):
+                t_ns = started_ns + int((i * dwell + settle_t) * 1e9)
+                on_step(chunk_start + i, v_set, float(v_read), t_ns, settle_t)
+
+            stats.overhead_total += (time.perf_counter() - chunk_t0) - n * settle_t
+            stats.settle_total += n * settle_t
+            stats.steps_done += n
+            chunk_start += n
+    finally:
+        # Back to host stepped operation
+        for instrument, commands in ((psu, ["VOLT:MODE FIX", "TRIG:SOUR IMM"]),
+                                     (dmm, ["TRIG:SOUR IMM", "TRIG:DEL:AUTO ON", "TRIG:COUN 1"])):
+            try:
+                for command in commands:
+                    instrument.write(command)
+            except Exception:
+                pass
+
+    if stats.ok and not poll_instrument_errors(psu, "PSU", log):
+        log("⚠️ PSU reported errors during the list sweep")
+        stats.ok = False
+
+    return stats
+
+
+@dataclass
+class SweepResult:
+    stats: SweepStats = field(default_factory=SweepStats)
+    duration: float = 0.0 # Seconds from output on to the last point
+    output_file: str = ""
+    writer_max_depth: int = 0
+    writer_dropped: int = 0
+    resumed_from: int = 0 # Points already in the output file when the run started
+    stopped: bool = False # stop() was called before the sweep finished
+    trace: Optional[visa_trace.CommandTrace] = None
+    analysis: Optional[dict] = None # Column label -> analysis.ChannelAnalysis
+
+
+class SweepRun:
+    """One sweep: connect, configure, run the selected loop and clean up.
+
+    on_sample(idx, total, v_set, v_read, t_ns, settle_s) is called for every point and
+    on_status(text) before each settle, both from the thread calling run().
+    stop() and force_cleanup() may be called from any other thread.
+
+    Sessions come from pool (a session_pool.SessionPool) and stay open after
+    the run, so repeated runs skip the open / *IDN? / error drain. Without a
+    pool the run opens its own and closes it in force_cleanup().
+    """
+
+    def __init__(self, config, rm, log=print, on_sample=_noop, on_status=_noop, pool=None):
+        self.config = config
+        self.rm = rm
+        self.log = log
+        self.on_sample = on_sample
+        self.on_status = on_status
+        self.pool = pool if pool is not None else session_pool.SessionPool(rm, on_open=clear_instrument_errors)
+        self._own_pool = pool is None
+        self._addresses = [] # Pool addresses used by this run
+        self.channel_labels = None # Multi-channel runs: one reading column per label
+        self.psu = None
+        self.dmm = None
+        self.psu_profile = None # drivers.PsuProfile / DmmProfile of the connected instruments
+        self.dmm_profile = None
+        self.samples = 1
+        self.nplc = None # Integration time set by _configure_dmm, None = instrument default
+        self.list_mode = False # sweep_mode "list" and both profiles support it
+        self.binary = False
+        self.auto_settle = None
+        self.is_running = False
+        self.started_at = None # time.time() when the output was turned on
+        self.resumed_from = 0 # Points already in the output file, not measured by this run
+        self.trace = None
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self):
+        cfg = self.config
+        cfg.validate()
+        self.is_running = True
+        result = SweepResult(output_file=data_sinks.output_path(cfg.output_file))
+        self.trace = result.trace = visa_trace.CommandTrace() if cfg.trace_commands else None
+        failed = False
+        try:
+            self._connect()
+            voltages = cfg.voltages()
+            if not self._configure():
+                result.stats.ok = False
+                return result
+
+            # Rows go through a bounded ring buffer to a writer thread, so disk stalls don't
+            # touch step timing. Leaving the with block (also on an exception) drains and
+            # fsyncs everything acquired so far, before the PSU output is turned off below.
+            sink_options = {"resume": cfg.resume, "measurement": cfg.measurement}
+            writer_options = {}
+            if (cfg.checkpoint or cfg.resume) and data_sinks.sink_type(result.output_file).resumable:
+                # The file is what a resume starts from, so every row goes to disk as it comes in
+                sink_options["batch_size"] = 1
+                writer_options["fsync_interval"] = 0.0
+            sink = data_sinks.AsyncSinkWriter(
+                data_sinks.open_sink(result.output_file, dtype=data_sinks.sample_dtype(self.channel_labels),
+                                     **sink_options),
+                capacity=cfg.writer_queue_size,
+                policy=cfg.writer_policy,
+                log=self.log,
+                **writer_options,
+            )
+            with sink:
+                total = len(voltages)
+                # Rows already in a resumed file are setpoints that don't need measuring again
+                done = result.resumed_from = self.resumed_from = sink.sink.rows_written
+                if done >= total:
+                    self.log(f"{result.output_file} already has all {total} points, nothing to measure")
+                    return result
+                if done:
+                    self.log(f"Resuming {result.output_file} at point {done + 1} of {total}")
+                    voltages = voltages[done:]
+                    self._set_start(next(iter(voltages)))
+
+                self._output_on()
+                start_time_process = self.started_at = time.time()
+                multi = bool(self.channel_labels)
+
+                def on_step(idx, v_set, v_read, t_ns, settle_s):
+                    if cfg.sweep_mode == "adaptive":
+                        voltages.record(v_set, v_read) # Picks the next setpoint
+                    if multi:
+                        sink.append(t_ns, v_set, *v_read, settle_s)
+                    else:
+                        sink.append(t_ns, v_set, v_read, settle_s)
+                    self.on_sample(done + idx, total, v_set, v_read, t_ns, settle_s)
+
+                def on_settle(v_set):
+                    self.on_status(f"Status: Setting {v_set:.3f}V & Settling...")
+
+                sweep_start_ns = time.monotonic_ns()
+                result.stats = self._run_loop(voltages, on_step, on_settle)
+                result.stopped = not self.is_running
+                if self.trace:
+                    self.trace.add_span("Sweep", sweep_start_ns, time.monotonic_ns())
+
+            result.duration = time.time() - start_time_process
+            result.writer_max_depth = sink.max_depth
+            result.writer_dropped = sink.dropped
+
+            # Calculate final duration
+            d_mins, d_secs = divmod(int(result.duration), 60)
+            self.log(f"Measurement Complete. Total Duration: {d_mins:02d}:{d_secs:02d}")
+            writer_msg = f"Output writer: peak queue depth {sink.max_depth}/{sink.capacity}"
+            if sink.dropped:
+                writer_msg += f", ⚠️ {sink.dropped} rows dropped"
+            self.log(writer_msg)
+            if self.auto_settle and result.stats.steps_done:
+                self.log(f"Auto settle: average {result.stats.settle_total / result.stats.steps_done * 1000:.1f} ms/point, "
+                         f"{self.auto_settle.timeouts} points hit the {cfg.settle_time:g} s timeout")
+            if cfg.sweep_mode == "adaptive":
+                self.log(f"Adaptive sweep: {len(voltages.readings)} of {voltages.grid_points} grid points measured, "
+                         f"{voltages.refined} added by refinement")
+            if self.trace:
+                self._report_trace()
+            if cfg.analyze and result.stats.steps_done:
+                self.force_cleanup() # Output off first, a long run can take seconds to analyze
+                result.analysis = self._analyze(result.output_file)
+            return result
+
+        except Exception:
+            failed = True
+            raise
+
+        finally:
+            self._finish(failed)
+
+    def _finish(self, failed):
+        """End of run(): output off, then after a failure drop the sessions from the pool.
+
+        The order matters, the output-off command needs the session still open.
+        """
+        try:
+            self.force_cleanup()
+        finally:
+            if failed:
+                # The sessions may be dead (instrument power cycled, cable pulled), reopen next time
+                for address in self._addresses:
+                    self.pool.discard(address)
+            self.is_running = False
+
+    def _analyze(self, path):
+        """Summarize the output file; a failure here is logged, the data is already safe on disk."""
+        import analysis # Only needed at the end of a run
+        try:
+            results = analysis.analyze_file(path, self.config.outlier_sigma,
+                                            unit=data_sinks.READING_TITLES[self.config.measurement][1])
+        except Exception as e:
+            self.log(f"⚠️ Analysis of {path} failed: {e}")
+            return None
+        for label, channel in results.items():
+            self.log(f"Analysis{' ' + label if label else ''}: {channel.describe()}")
+        self.log(f"Summary written to {analysis.summary_path(path)}, point flags to {analysis.flags_path(path)}")
+        return results
+
+    def _open_session(self, address, name):
+        """Get a session from the pool, with stale errors cleared, wrapped for tracing.
+
+        Returns (session, idn), the *IDN? reply selects the driver profile.
+        """
+        session, idn, reused = self.pool.acquire(address)
+        if address not in self._addresses:
+            self._addresses.append(address)
+        if reused:
+            self.log(f"Reusing open session to {name}: {idn}")
+            session.write("*CLS") # One write instead of draining the error queue
+        else:
+            self.log(f"Connected to {name}: {idn}")
+        if self.trace:
+            session = visa_trace.TracedSession(session, name, self.trace)
+        return session, idn
+
+    def _psu_profile_for(self, idn, name):
+        profile = drivers.psu_profile_for(idn, self.config.psu_profile)
+        self.log(f"{name} profile: {profile.name}")
+        return profile
+
+    def _dmm_profile_for(self, idn, name):
+        profile = drivers.dmm_profile_for(idn, self.config.dmm_profile)
+        self.log(f"{name} profile: {profile.name}")
+        return profile
+
+    def _connect(self):
+        cfg = self.config
+        try:
+            self.psu, idn = self._open_session(cfg.psu_address, "PSU")
+            self.psu_profile = self._psu_profile_for(idn, "PSU")
+            self.dmm, idn = self._open_session(cfg.dmm_address, "DMM")
+            self.dmm_profile = self._dmm_profile_for(idn, "DMM")
+            enable_error_status(self.psu)
+
+        except Exception as e:
+            self.log(f"Connection Failed: {e}")
+            raise
+
+    def _configure_psu(self, psu, channel, profile):
+        """Select the channel and set the start voltage and current limit."""
+        cfg = self.config
+        select = profile.select_command(channel)
+        if select:
+            psu.write(select)
+        psu.write(profile.voltage_command(next(iter(cfg.voltages()), cfg.start_voltage))) # Output comes on at the first setpoint
+        psu.write(profile.set_current.format(amps=cfg.current_limit))
+
+    def _configure_dmm(self, dmm, name, profile):
+        """Measurement function, impedance, sampling and reading format. Returns (binary, auto_settle)."""
+        cfg = self.config
+        function = profile.function(cfg.measurement)
+
+        # Default is the instrument's slowest, most accurate integration time
+        dmm.write(function.configure)
+
+        # Configure High-Z mode (DC volts only)
+        if function.high_impedance:
+            if cfg.high_impedance:
+                dmm.write(function.high_impedance[0])
+                self.log(f"{name} High-Z mode enabled (10GΩ for 100mV/1V ranges)")
+            else:
+                dmm.write(function.high_impedance[1])
+                self.log(f"{name} High-Z mode disabled (using standard impedance)")
+
+        nplc = self.nplc = profile.nearest_nplc(cfg.nplc)
+        if nplc != cfg.nplc:
+            self.log(f"{name} has no NPLC {cfg.nplc:g}, using {nplc:g}")
+
+        # Buffered acquisition: one trigger fills the reading memory, one transfer returns it
+        buffered = profile.reading_buffer
+        if buffered and (self.samples > 1 or nplc is not None):
+            configure_dmm_sampling(dmm, self.samples, nplc, function.nplc)
+            self.log(f"{name} buffered mode: {self.samples} samples/point, NPLC {'default' if nplc is None else f'{nplc:g}'}")
+        elif nplc is not None:
+            dmm.write(function.nplc_command(nplc))
+        if self.samples > 1 and not buffered:
+            self.log(f"{name} has no reading buffer, averaging {self.samples} READ? queries per point")
+
+        # Bulk readings come back as binary blocks where the DMM supports it. CONF doesn't
+        # reset the format and an earlier run or process may have left the DMM in REAL,64,
+        # so every other run switches back explicitly.
+        binary = False
+        if profile.binary and buffered and (self.samples > 1 or self.list_mode):
+            binary = enable_binary_readings(dmm, name, self.log)
+        elif profile.binary:
+            dmm.write("FORM:DATA ASCII")
+
+        auto_settle = None
+        if cfg.settle_mode == "auto":
+            if self.list_mode:
+                self.log("List mode settles on the instrument, using the fixed settle time")
+            elif not buffered:
+                self.log(f"{name} has no reading buffer for settle bursts, using the fixed settle time")
+            else:
+                settle_nplc = profile.nearest_nplc(cfg.settle_nplc)
+                auto_settle = AutoSettle(
+                    dmm, cfg.settle_tolerance, cfg.settle_time,
+                    stable_samples=cfg.settle_samples,
+                    fast_nplc=settle_nplc,
+                    final_nplc=nplc,
+                    samples=self.samples,
+                    binary=binary,
+                    nplc_header=function.nplc,
+                    log=self.log,
+                )
+                unit = data_sinks.READING_TITLES[cfg.measurement][1]
+                self.log(f"{name} auto settle: bursts of {auto_settle.stable_samples}, means within {cfg.settle_tolerance:g} {unit} "
+                         f"at NPLC {settle_nplc:g}, timeout {cfg.settle_time:g} s")
+        return binary, auto_settle
+
+    def _dmm_reader(self, dmm, profile, binary):
+        """make_dmm_reader for a DMM set up by _configure_dmm."""
+        return make_dmm_reader(dmm, self.samples, binary, buffered=profile.reading_buffer)
+
+    def _configure(self):
+        """Set up both instruments, returns False if either reports an error."""
+        cfg = self.config
+
+        self._configure_psu(self.psu, cfg.channel, self.psu_profile)
+
+        # Check for PSU errors
+        if not check_instrument_errors(self.psu, "PSU", self.log):
+            self.log("⚠️ Aborting due to PSU error")
+            return False
+
+        self.samples = max(1, cfg.samples_per_point)
+        self.list_mode = cfg.sweep_mode == "list" and self._list_mode_supported()
+        self.binary, self.auto_settle = self._configure_dmm(self.dmm, "DMM", self.dmm_profile)
+
+        # Check for DMM errors
+        if not check_instrument_errors(self.dmm, "DMM", self.log):
+            self.log("⚠️ Aborting due to DMM error")
+            return False
+        return True
+
+    def _output_on(self):
+        self.log(f"Enabling Output on Channel {self.config.channel}")
+        self.psu.write(self.psu_profile.output_command(True))
+
+    def _set_start(self, v_set):
+        """Move the setpoint (output still off) to where a resumed run starts, see _configure_psu."""
+        self.psu.write(self.psu_profile.voltage_command(v_set))
+
+    def _run_loop(self, voltages, on_step, on_settle):
+        cfg = self.config
+        should_continue = lambda: self.is_running
+
+        if self.list_mode:
+            try:
+                return run_list_sweep(
+                    self.psu, self.dmm, voltages, cfg.settle_time,
+                    on_step=on_step,
+                    should_continue=should_continue,
+                    log=self.log,
+                    samples=self.samples,
+                    measure_window=self._list_measure_window(),
+                    binary=self.binary,
+                )
+            except ListModeNotSupported as e:
+                self.log(f"List mode not available ({e}), falling back to Stepped")
+
+        # Adaptive setpoints depend on the previous reading, so they can't be queued ahead
+        run_sweep = run_concurrent_sweep if cfg.sweep_mode == "concurrent" else run_serial_sweep
+        return run_sweep(
+            self.psu, self.dmm, voltages, cfg.settle_time,
+            on_step=on_step,
+            should_continue=should_continue,
+            log=self.log,
+            error_check_interval=cfg.error_check_interval,
+            on_settle=on_settle,
+            measure=self._dmm_reader(self.dmm, self.dmm_profile, self.binary),
+            settle=self.auto_settle,
+            voltage_command=self.psu_profile.voltage_command,
+        )
+
+    def _list_measure_window(self):
+        """list_measure_window, raised if it's too short for samples readings at the DMM's NPLC."""
+        cfg = self.config
+        nplc = DEFAULT_NPLC if self.nplc is None else self.nplc
+        # Auto zero takes a second conversion per reading, plus 25% for trigger and range overhead
+        needed = 1.25 * self.samples * 2 * nplc / LINE_FREQUENCY
+        if needed <= cfg.list_measure_window:
+            return cfg.list_measure_window
+        self.log(f"List mode: {self.samples} readings at NPLC {nplc:g} take up to {needed * 1000:.0f} ms, "
+                 f"measure window raised from {cfg.list_measure_window * 1000:g} ms")
+        return needed
+
+    def _list_mode_supported(self):
+        """Whether the profiles have what run_list_sweep needs, logs why not."""
+        missing = []
+        if not self.psu_profile.list_mode:
+            missing.append(f"{self.psu_profile.name} has no list mode")
+        if not (self.dmm_profile.external_trigger and self.dmm_profile.reading_buffer):
+            missing.append(f"{self.dmm_profile.name} has no external trigger with reading buffer")
+        if missing:
+            self.log(f"List mode not available ({', '.join(missing)}), falling back to Stepped")
+        return not missing
+
+    def _report_trace(self):
+        self.log("VISA command latency (slowest first by total time):")
+        for line in self.trace.format_summary(limit=8):
+            self.log(line)
+        if self.trace.events_dropped:
+            self.log(f"Trace buffer full, {self.trace.events_dropped} commands counted but not kept")
+        if self.config.trace_file:
+            try:
+                self.trace.export_chrome_trace(self.config.trace_file)
+                self.log(f"Command trace written to {self.config.trace_file}")
+            except OSError as e:
+                self.log(f"Could not write command trace: {e}")
+
+    def force_cleanup(self):
+        """Turn the PSU output off and release the sessions. Safe to call twice."""
+        psu = self.psu
+        self.psu = None
+        self.dmm = None
+        if psu:
+            try:
+                self.log("Turning off PSU Output...")
+                psu.write((self.psu_profile or drivers.GENERIC_PSU).output_command(False))
+            except Exception:
+                pass
+        self._release_sessions()
+
+    def _release_sessions(self):
+        if self._own_pool:
+            self.pool.close_all()
+
+
+def create_run(config, rm, **kwargs):
+    """SweepRun for a single channel config, multi_sweep.MultiChannelRun if config.channels is set,
+    continuous_log.ContinuousRun in continuous mode."""
+    if config.sweep_mode == "continuous":
+        import continuous_log # Builds on this module, so imported on demand
+        return continuous_log.ContinuousRun(config, rm, **kwargs)
+    if config.channels:
+        import multi_sweep # Builds on this module, so imported on demand
+        return multi_sweep.MultiChannelRun(config, rm, **kwargs)
+    return SweepRun(config, rm, **kwargs)
+
+
+def load_spec(path):
+    """Read a run spec from a .json or .yaml/.yml file into a dict."""
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("YAML run specs need PyYAML: pip install pyyaml")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sweep_engine", description="Run a PSU/DMM voltage sweep without the GUI.")
+    parser.add_argument("spec", help="run spec (.json, .yaml or .yml) with SweepConfig fields")
+    parser.add_argument("--output", help="output file, overrides output_file in the spec")
+    parser.add_argument("--backend", default="", help="pyvisa backend, e.g. @py")
+    parser.add_argument("--simulate", action="store_true", help="run against the simulated PSU/DMM in sim_backend")
+    parser.add_argument("--trace", help="write a Chrome trace JSON of every VISA command to this file")
+    parser.add_argument("--quiet", action="store_true", help="don't print every sample")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.output:
+        spec["output_file"] = args.output
+    if args.trace:
+        spec["trace_file"] = args.trace
+    if args.simulate:
+        import sim_backend
+        if spec.get("channels"):
+            spec["channels"], rm = sim_backend.simulated_rack(spec["channels"])
+        else:
+            spec["psu_address"] = sim_backend.SIM_PSU_ADDRESS
+            spec["dmm_address"] = sim_backend.SIM_DMM_ADDRESS
+            rm = sim_backend.SimResourceManager()
+    else:
+        import pyvisa # Only needed when actually talking to instruments
+        rm = pyvisa.ResourceManager(args.backend)
+    config = SweepConfig.from_dict(spec)
+    config.validate()
+    unit = data_sinks.READING_TITLES[config.measurement][1]
+
+    def on_sample(idx, total, v_set, v_read, t_ns, settle_s):
+        if not args.quiet:
+            meas = " ".join(f"{v:.6f}{unit}" for v in v_read) if isinstance(v_read, tuple) else f"{v_read:.6f}{unit}"
+            print(f"[{idx + 1}/{total}] Set: {v_set:.3f}V | Meas: {meas} | Settle: {settle_s * 1000:.1f} ms")
+
+    run = create_run(config, rm, log=print, on_sample=on_sample)
+    try:
+        result = run.run()
+    except KeyboardInterrupt:
+        # run() has already turned the output off on its way out
+        print("Interrupted")
+        return 130
+    print(f"{result.stats.steps_done} points written to {result.output_file}")
+    return 0 if result.stats.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""The PSU output must go off when a run dies halfway, against the simulated bench."""
+import pytest
+
+import session_pool
+import sim_backend
+from sweep_engine import SweepConfig, SweepRun
+
+
+def failing_dmm_rm():
+    """SimResourceManager whose DMM times out on READ?, like a pulled cable mid-sweep."""
+    rm = sim_backend.SimResourceManager()
+    open_resource = rm.open_resource
+
+    def open_failing(resource_name, **kwargs):
+        session = open_resource(resource_name, **kwargs)
+        if resource_name == sim_backend.SIM_DMM_ADDRESS:
+            query = session.query
+
+            def query_failing(command):
+                if command.startswith("READ?"):
+                    raise TimeoutError("VI_ERROR_TMO")
+                return query(command)
+            session.query = query_failing
+        return session
+
+    rm.open_resource = open_failing
+    return rm
+
+
+def make_config(tmp_path):
+    return SweepConfig(
+        psu_address=sim_backend.SIM_PSU_ADDRESS,
+        dmm_address=sim_backend.SIM_DMM_ADDRESS,
+        output_file=str(tmp_path / "out.csv"),
+        stop_voltage=1.0,
+        step_voltage=0.1,
+        settle_time=0.0,
+        analyze=False,
+        trace_commands=False,
+    )
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+def test_output_off_on_error(tmp_path, pooled):
+    rm = failing_dmm_rm()
+    pool = session_pool.SessionPool(rm) if pooled else None
+    run = SweepRun(make_config(tmp_path), rm, log=lambda msg: None, pool=pool)
+
+    with pytest.raises(TimeoutError):
+        run.run()
+
+    psu = rm.opened[0]
+    assert psu.resource_name == sim_backend.SIM_PSU_ADDRESS
+    assert psu.counts.get("OUTP", 0) >= 2 # On, then off again
+    assert not rm.bench.outputs[0][1].on
+    assert not run.is_running
+    if pooled:
+        # Dropped only after the output-off command went out on it
+        assert psu.closed
+        assert not pool.acquire(sim_backend.SIM_PSU_ADDRESS)[2]
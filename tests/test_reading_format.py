@@ -0,0 +1,31 @@
+"""A DMM left in REAL,64 by an earlier run or process must still give ASCII single readings."""
+import numpy as np
+
+import session_pool
+import sim_backend
+from sweep_engine import SweepConfig, SweepRun
+
+
+def test_ascii_restored_for_single_readings(tmp_path):
+    rm = sim_backend.SimResourceManager()
+    pool = session_pool.SessionPool(rm)
+    dmm = pool.acquire(sim_backend.SIM_DMM_ADDRESS)[0]
+    dmm.write("FORM:DATA REAL,64") # As another process would have left it
+
+    readings = []
+    config = SweepConfig(
+        psu_address=sim_backend.SIM_PSU_ADDRESS,
+        dmm_address=sim_backend.SIM_DMM_ADDRESS,
+        output_file=str(tmp_path / "out.csv"),
+        stop_voltage=1.0,
+        step_voltage=0.5,
+        settle_time=0.0,
+        samples_per_point=1,
+        analyze=False,
+        trace_commands=False,
+    )
+    SweepRun(config, rm, log=lambda msg: None, pool=pool,
+             on_sample=lambda idx, total, v_set, v_read, t_ns, settle_s: readings.append(v_read)).run()
+
+    assert not dmm.binary
+    assert np.allclose(readings, [0.0, 0.25, 0.5])
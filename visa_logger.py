@@ -4,38 +4,141 @@ from idlelib.tooltip import Hovertip
 import pyvisa
 import time
 import threading
-import csv
+from collections import deque
 import os
 from datetime import datetime
 
+import batch
+import data_sinks
+import discovery
+import drivers
+import session_pool
+import sweep_engine
+from live_plot import LivePlot, PlotBuffer
+
+# GUI refresh period for worker updates (20 Hz) and number of lines kept in the log view
+UI_POLL_MS = 50
+LOG_MAX_LINES = 1000
+
+# Sweep Mode combobox entries -> SweepConfig.sweep_mode
+SWEEP_MODES = {
+    "Stepped": "stepped",
+    "Stepped - Concurrent I/O": "concurrent",
+    "PSU List Mode": "list",
+    "Adaptive Refinement": "adaptive",
+    "Continuous Logging": "continuous",
+}
+
+# Measurement combobox entries -> SweepConfig.measurement
+MEASUREMENTS = {
+    "DC Voltage": "volt_dc",
+    "DC Current": "curr_dc",
+    "2-Wire Resistance": "res_2w",
+    "4-Wire Resistance": "res_4w",
+}
+
+# Step Spacing combobox entries -> SweepConfig.setpoint_source (piecewise segments are run spec only)
+SETPOINT_SPACINGS = {
+    "Linear": "linear",
+    "Logarithmic": "log",
+    "From File": "file",
+}
+
+
+class UiUpdateChannel:
+    """Thread-safe hand-off from worker threads to the Tk main loop.
+
+    Workers overwrite the latest progress and status (intermediate values are
+    coalesced away) and queue log lines into a bounded deque. The UI drains
+    both once per frame, so the Tk event queue never sees per-sample callbacks.
+    """
+
+    def __init__(self, max_log_lines=LOG_MAX_LINES):
+        self._lock = threading.Lock()
+        self._progress = None
+        self._status = None
+        self._log_lines = deque(maxlen=max_log_lines)
+
+    def post_log(self, line):
+        with self._lock:
+            self._log_lines.append(line)
+
+    def set_progress(self, *values):
+        with self._lock:
+            self._progress = values
+
+    def set_status(self, text):
+        with self._lock:
+            self._status = text
+
+    def take(self):
+        """Return (progress, status, log_lines) posted since the last call."""
+        with self._lock:
+            progress, status, lines = self._progress, self._status, list(self._log_lines)
+            self._progress = None
+            self._status = None
+            self._log_lines.clear()
+        return progress, status, lines
+
+
 class VisaLoggerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Power Supply & DMM Controller")
-        self.root.geometry("600x750")
+        self.root.geometry("600x850")
 
         # Default variable values
         self.start_voltage = tk.DoubleVar(value=0.0)
         self.stop_voltage = tk.DoubleVar(value=5.0)
         self.step_voltage = tk.DoubleVar(value=0.5)
+        self.setpoint_spacing = tk.StringVar(value="Linear")
+        self.points_per_decade = tk.DoubleVar(value=10)
+        self.setpoint_file = tk.StringVar(value="")
         self.current_limit = tk.DoubleVar(value=1.0) # Amps
         self.settle_time = tk.DoubleVar(value=0.5) # Seconds
+        self.samples_per_point = tk.IntVar(value=1) # DMM readings averaged per setpoint
+        self.dmm_nplc = tk.StringVar(value="") # Blank = instrument default
+        self.adaptive_tolerance = tk.DoubleVar(value=0.005) # Volts
+        self.adaptive_max_points = tk.IntVar(value=2000)
+        self.auto_settle = tk.BooleanVar(value=False)
+        self.settle_tolerance = tk.DoubleVar(value=0.001) # Volts
+        self.sample_rate = tk.DoubleVar(value=1.0) # Continuous logging, samples per second
+        self.log_duration = tk.DoubleVar(value=0.0) # Continuous logging seconds, 0 = until stopped
         self.psu_address = tk.StringVar()
         self.dmm_address = tk.StringVar()
         self.output_file = tk.StringVar(value="measurements")
         self.psu_channel = tk.StringVar(value="1 - Yellow")
         self.high_impedance_mode = tk.BooleanVar(value=True)
+        self.measurement = tk.StringVar(value="DC Voltage")
+        self.reading_unit = "V" # Unit of the running measurement, for the log lines
+        self.sweep_mode = tk.StringVar(value="Stepped")
+        self.known_only_scan = tk.BooleanVar(value=True)
         
         # Tuning factor for time estimation (seconds per step for VISA comms overhead)
+        # Replaced by the measured value after each completed sweep
         self.overhead_per_step = 0.9
 
         self.is_running = False
         self.rm = pyvisa.ResourceManager()
-        self.active_psu = None
-        self.active_dmm = None
+        self.discovery_cache = discovery.DiscoveryCache().load()
+        # Instrument sessions stay open between runs, closed when the app exits
+        self.session_pool = session_pool.SessionPool(self.rm, on_open=sweep_engine.clear_instrument_errors)
+        self.active_run = None
+        self.last_trace = None # visa_trace.CommandTrace of the last run
+
+        self.ui_channel = UiUpdateChannel()
+        self.plot_buffer = PlotBuffer()
+        self.log_rate = None # Continuous logging: samples/s, the plot's x axis is then time
 
         self._create_ui()
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.after(UI_POLL_MS, self._poll_ui_channel)
+
+        # Show cached instruments immediately, then check they still answer
+        cached = self.discovery_cache.fresh()
+        if cached:
+            self._update_resource_list([discovery.friendly_name(res, idn) for res, idn in cached.items()])
+            threading.Thread(target=self._scan_resources_thread, args=(list(cached),), daemon=True).start()
 
     def _create_ui(self):
         # Resource Selection Frame
@@ -70,42 +173,124 @@ class VisaLoggerApp:
             text="Enable DMM Auto High-Z Mode",
             variable=self.high_impedance_mode
         )
-        self.high_imp_check.grid(row=3, column=0, columnspan=2, sticky="w", pady=5)
+        self.high_imp_check.grid(row=4, column=0, columnspan=2, sticky="w", pady=5)
         
         # Add tooltip with detailed information
         Hovertip(self.high_imp_check, 
                  "When enabled, the DMM automatically uses 10GΩ input impedance on 100mV and 1V ranges\n"
                  "and 10MΩ input impedance for all other ranges. When disabled, the DMM uses a fixed 10MΩ\n"
-                 "input impedance for all ranges.")
+                 "input impedance for all ranges. DC Voltage only, on DMMs that have the setting.")
+
+        ttk.Label(resource_frame, text="Measurement:").grid(row=3, column=0, sticky="w")
+        self.measurement_combo = ttk.Combobox(resource_frame, textvariable=self.measurement, width=25, state="readonly")
+        self.measurement_combo['values'] = tuple(MEASUREMENTS)
+        self.measurement_combo.grid(row=3, column=1, sticky="w", padx=5)
+        Hovertip(self.measurement_combo,
+                 "What the DMM measures at every setpoint. The commands, reading buffer, binary transfers and\n"
+                 "list mode support come from the driver profile matched to each instrument's *IDN? model.")
         
-        ttk.Button(resource_frame, text="Scan for Instruments", command=self.scan_resources).grid(row=4, column=1, sticky="e", pady=5)
+        ttk.Label(resource_frame, text="Sweep Mode:").grid(row=5, column=0, sticky="w")
+        self.mode_combo = ttk.Combobox(resource_frame, textvariable=self.sweep_mode, width=25, state="readonly")
+        self.mode_combo['values'] = tuple(SWEEP_MODES)
+        self.mode_combo.grid(row=5, column=1, sticky="w", padx=5)
+        Hovertip(self.mode_combo,
+                 "Stepped: the host sets, settles and measures every point.\n"
+                 "Concurrent I/O: same order per point, but the PSU and DMM each get their own I/O thread so\n"
+                 "error polling and the next setpoint write overlap with the settle, CSV write and UI update.\n"
+                 "PSU List Mode: the voltage list is uploaded and runs on the PSU with a single trigger. The PSU\n"
+                 "trigger output must be wired to the DMM external trigger input. Falls back to Stepped if either profile lacks it.\n"
+                 "Adaptive Refinement: measures every 16th step first, then adds points (down to the step size) only\n"
+                 "where the readings deviate from a straight line by more than the adaptive tolerance.\n"
+                 "Continuous Logging: holds the Start Voltage and logs the DMM and the PSU's voltage/current\n"
+                 "readback at the log sample rate, for soak and stability tests.")
+
+        self.known_only_check = ttk.Checkbutton(
+            resource_frame,
+            text="Skip serial ports that never answered",
+            variable=self.known_only_scan
+        )
+        self.known_only_check.grid(row=6, column=0, sticky="w", pady=5)
+        Hovertip(self.known_only_check,
+                 "Fast scan: ASRL (serial) ports that have never replied to *IDN? are listed but not probed.\n"
+                 "Uncheck to probe every port, e.g. after connecting a new serial instrument.")
+        ttk.Button(resource_frame, text="Scan for Instruments", command=self.scan_resources).grid(row=6, column=1, sticky="e", pady=5)
 
         # Parameters Frame
         param_frame = ttk.LabelFrame(self.root, text="Measurement Parameters", padding=10)
         param_frame.pack(fill="x", padx=10, pady=5)
 
+        # Rows only some sweep modes use, shown by _update_param_rows: group -> widgets
+        self._param_rows = {}
+
         self._add_param(param_frame, "Start Voltage (V):", self.start_voltage, 0)
-        self._add_param(param_frame, "Stop Voltage (V):", self.stop_voltage, 1)
-        self._add_param(param_frame, "Step Size (V):", self.step_voltage, 2)
-        self._add_param(param_frame, "Current Limit (A):", self.current_limit, 3)
-        self._add_param(param_frame, "Settle Time (s):", self.settle_time, 4)
+        self._add_param(param_frame, "Stop Voltage (V):", self.stop_voltage, 1, group="stop")
+        self._add_param(param_frame, "Step Size (V):", self.step_voltage, 2, group="step")
+
+        spacing_label = ttk.Label(param_frame, text="Step Spacing:")
+        spacing_label.grid(row=3, column=0, sticky="w", padx=5, pady=2)
+        self.spacing_combo = ttk.Combobox(param_frame, textvariable=self.setpoint_spacing, width=15, state="readonly")
+        self.spacing_combo['values'] = tuple(SETPOINT_SPACINGS)
+        self.spacing_combo.grid(row=3, column=1, sticky="w", padx=5, pady=2)
+        self._param_rows["spacing"] = [spacing_label, self.spacing_combo]
+        Hovertip(self.spacing_combo,
+                 "Linear: Start to Stop in Step Size steps.\n"
+                 "Logarithmic: Start to Stop (both above 0 V) with Points / Decade points per factor of 10.\n"
+                 "From File: setpoints from a .csv/.txt (one per line, or the Set Voltage column of an earlier\n"
+                 "run) or .npy file, read as the sweep runs. Start/Stop/Step are ignored.")
+        self._add_param(param_frame, "Points / Decade (log):", self.points_per_decade, 4, group="per_decade")
+        setpoint_file_label = ttk.Label(param_frame, text="Setpoint File:")
+        setpoint_file_label.grid(row=5, column=0, sticky="w", padx=5, pady=2)
+        setpoint_file_frame = ttk.Frame(param_frame)
+        setpoint_file_frame.grid(row=5, column=1, sticky="w", padx=5, pady=2)
+        self._param_rows["setpoint_file"] = [setpoint_file_label, setpoint_file_frame]
+        ttk.Entry(setpoint_file_frame, textvariable=self.setpoint_file, width=25).pack(side="left")
+        ttk.Button(setpoint_file_frame, text="...", width=3, command=self.browse_setpoint_file).pack(side="left", padx=2)
+
+        self._add_param(param_frame, "Current Limit (A):", self.current_limit, 6)
+        self._add_param(param_frame, "Settle Time (s):", self.settle_time, 7)
+        self._add_param(param_frame, "Samples / Point:", self.samples_per_point, 8)
+        self._add_param(param_frame, "DMM NPLC (blank = default):", self.dmm_nplc, 9)
+        self._add_param(param_frame, "Adaptive Tolerance (V):", self.adaptive_tolerance, 10, group="adaptive")
+        self._add_param(param_frame, "Adaptive Max Points:", self.adaptive_max_points, 11, group="adaptive")
+        self._add_param(param_frame, "Settle Tolerance (V):", self.settle_tolerance, 12, group="settle_tolerance")
+        self._add_param(param_frame, "Log Sample Rate (Hz):", self.sample_rate, 13, group="log")
+        self._add_param(param_frame, "Log Duration (s, 0 = until stopped):", self.log_duration, 14, group="log")
+
+        self.auto_settle_check = ttk.Checkbutton(
+            param_frame,
+            text="Auto Settle (Settle Time becomes the timeout)",
+            variable=self.auto_settle
+        )
+        self.auto_settle_check.grid(row=15, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        self._param_rows["auto_settle"] = [self.auto_settle_check]
+        Hovertip(self.auto_settle_check,
+                 "After each setpoint the DMM takes fast bursts of 3 readings (NPLC 0.02) until the averages\n"
+                 "of two bursts in a row agree within the settle tolerance, then measures at the NPLC set\n"
+                 "above. Settle Time is the longest it waits. The settle time used for each point is saved\n"
+                 "with the data.")
 
         # Estimates
-        ttk.Separator(param_frame, orient='horizontal').grid(row=5, column=0, columnspan=2, sticky="ew", pady=5)
+        ttk.Separator(param_frame, orient='horizontal').grid(row=16, column=0, columnspan=2, sticky="ew", pady=5)
         self.est_steps_label = ttk.Label(param_frame, text="Total Steps: --")
-        self.est_steps_label.grid(row=6, column=0, sticky="w", padx=5)
+        self.est_steps_label.grid(row=17, column=0, sticky="w", padx=5)
         self.est_total_time_label = ttk.Label(param_frame, text="Est. Total Time: --:--")
-        self.est_total_time_label.grid(row=6, column=1, sticky="w", padx=5)
+        self.est_total_time_label.grid(row=17, column=1, sticky="w", padx=5)
 
         # Bind traces
-        for var in [self.start_voltage, self.stop_voltage, self.step_voltage, self.settle_time]:
+        for var in [self.start_voltage, self.stop_voltage, self.step_voltage, self.settle_time,
+                    self.sweep_mode, self.adaptive_max_points, self.auto_settle,
+                    self.setpoint_spacing, self.points_per_decade, self.setpoint_file,
+                    self.sample_rate, self.log_duration]:
             var.trace_add("write", self.calculate_estimates)
+        for var in [self.sweep_mode, self.setpoint_spacing, self.auto_settle]:
+            var.trace_add("write", self._update_param_rows)
+        self._update_param_rows()
         
         # Initial calculation
         self.root.after(100, self.calculate_estimates)
 
         # Output Frame
-        file_frame = ttk.LabelFrame(self.root, text="CSV File Output Name", padding=10)
+        file_frame = ttk.LabelFrame(self.root, text="Output File Name (.csv, .npy, .parquet)", padding=10)
         file_frame.pack(fill="x", padx=10, pady=5)
         
         ttk.Entry(file_frame, textvariable=self.output_file, width=50).pack(side="left", fill="x", expand=True)
@@ -121,6 +306,12 @@ class VisaLoggerApp:
         self.stop_btn = ttk.Button(control_frame, text="Stop", command=self.stop_process, state="disabled")
         self.stop_btn.pack(side="left", padx=5)
 
+        self.batch_btn = ttk.Button(control_frame, text="Run Batch File...", command=self.start_batch)
+        self.batch_btn.pack(side="left", padx=5)
+
+        self.latency_btn = ttk.Button(control_frame, text="Command Latency...", command=self.show_latency, state="disabled")
+        self.latency_btn.pack(side="right", padx=5)
+
         # Progress
         progress_frame = ttk.LabelFrame(self.root, text="Progress", padding=10)
         progress_frame.pack(fill="x", padx=10, pady=5)
@@ -138,6 +329,12 @@ class VisaLoggerApp:
         self.status_label = ttk.Label(progress_frame, text="Status: Ready")
         self.status_label.pack(side="left", fill="x", expand=True, padx=20)
 
+        # Live Plot
+        plot_frame = ttk.LabelFrame(self.root, text="Live Plot (Measured vs. Set Voltage)", padding=10)
+        plot_frame.pack(fill="x", padx=10, pady=5)
+        self.live_plot = LivePlot(plot_frame, self.plot_buffer, height=180)
+        self.live_plot.pack(fill="x")
+
         # Log Text Box
         log_frame = ttk.LabelFrame(self.root, text="Log", padding=10)
         log_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -148,9 +345,36 @@ class VisaLoggerApp:
         scroll.pack(side="right", fill="y")
         self.log_text['yscrollcommand'] = scroll.set
 
-    def _add_param(self, parent, text, variable, row):
-        ttk.Label(parent, text=text).grid(row=row, column=0, sticky="w", padx=5, pady=2)
-        ttk.Entry(parent, textvariable=variable, width=15).grid(row=row, column=1, sticky="w", padx=5, pady=2)
+    def _add_param(self, parent, text, variable, row, group=None):
+        label = ttk.Label(parent, text=text)
+        label.grid(row=row, column=0, sticky="w", padx=5, pady=2)
+        entry = ttk.Entry(parent, textvariable=variable, width=15)
+        entry.grid(row=row, column=1, sticky="w", padx=5, pady=2)
+        if group:
+            self._param_rows.setdefault(group, []).extend([label, entry])
+
+    def _update_param_rows(self, *args):
+        """Show only the parameter rows the selected sweep mode and step spacing use."""
+        mode = SWEEP_MODES.get(self.sweep_mode.get(), "stepped")
+        spacing = SETPOINT_SPACINGS.get(self.setpoint_spacing.get(), "linear")
+        sweeping = mode != "continuous" # Continuous logging holds Start Voltage
+        visible = {
+            "stop": sweeping and spacing != "file",
+            "step": sweeping and spacing == "linear",
+            "spacing": sweeping,
+            "per_decade": sweeping and spacing == "log",
+            "setpoint_file": sweeping and spacing == "file",
+            "adaptive": mode == "adaptive",
+            "auto_settle": sweeping,
+            "settle_tolerance": sweeping and self.auto_settle.get(),
+            "log": mode == "continuous",
+        }
+        for group, widgets in self._param_rows.items():
+            for widget in widgets:
+                if visible[group]:
+                    widget.grid() # Back where grid_remove() found it
+                else:
+                    widget.grid_remove()
 
     def update_channel_color(self, event=None):
         val = self.psu_channel.get()
@@ -163,155 +387,226 @@ class VisaLoggerApp:
 
     def calculate_estimates(self, *args):
         try:
-            start = self.start_voltage.get()
-            stop = self.stop_voltage.get()
-            step_size = self.step_voltage.get()
-            settle = self.settle_time.get()
-            
-            if step_size <= 0:
-                raise ValueError("Step size must be positive")
+            config = self._build_config()
+            settle = config.settle_time
 
-            # Logic matches run_sequence
-            steps = int(abs(stop - start) / step_size) + 1
+            # Same count the sweep engine uses, without generating the setpoints
+            steps = config.step_count() # Upper bound in adaptive mode, usually far fewer
+            adaptive = config.sweep_mode == "adaptive"
             
             total_seconds = steps * (settle + self.overhead_per_step) # Use overhead tuning factor
+            if config.sweep_mode == "continuous":
+                if not steps:
+                    self.est_steps_label.config(text="Total Samples: until stopped")
+                    self.est_total_time_label.config(text="Est. Total Time: --:--")
+                    return
+                total_seconds = settle + config.duration # Fixed schedule, overhead doesn't add up
             
             mins, secs = divmod(int(total_seconds), 60)
             
-            self.est_steps_label.config(text=f"Total Steps: {steps}")
-            self.est_total_time_label.config(text=f"Est. Total Time: {mins:02d}:{secs:02d}")
+            prefix = "Max. " if adaptive or self.auto_settle.get() else ""
+            self.est_steps_label.config(text=f"{prefix}Total Steps: {steps}")
+            self.est_total_time_label.config(text=f"{prefix}Est. Total Time: {mins:02d}:{secs:02d}")
             
-        except (tk.TclError, ValueError):
+        except (tk.TclError, ValueError, OSError):
             # User is typing invalid params
             self.est_steps_label.config(text="Total Steps: --")
             self.est_total_time_label.config(text="Est. Total Time: --:--")
 
     def log(self, message):
+        """Queue a log line, safe to call from any thread."""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.config(state="normal")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
-        self.log_text.see("end")
-        self.log_text.config(state="disabled")
-
-    def check_instrument_errors(self, instrument, instrument_name):
-        """Check for SCPI errors in the instrument's error queue."""
-        try:
-            try: # Wait for operation to complete before checking errors
-                instrument.query("*OPC?") # IEEE-488 standard command that guarantees that commands previously sent to the instrument have completed
-            except:
-                # If *OPC? not supported, small delay
-                time.sleep(0.05)
-            
-            while True:
-                error_response = instrument.query("SYST:ERR?").strip()
-                # +0,"No error" means no errors in queue
-                if error_response.startswith("+0,") or error_response.startswith("0,"):
-                    break  # No more errors
-                else:
-                    # Log the error
-                    self.root.after(0, self.log, f"⚠️ {instrument_name} Error: {error_response}")
-                    return False  # False = errors found
-            return True  # True = no errors
-        except Exception as e:
-            # If not support SYST:ERR?, just log and continue
-            self.root.after(0, self.log, f"Could not query {instrument_name} errors: {e}")
-            return True
-
-    def clear_instrument_errors(self, instrument, instrument_name):
-        """Clear all errors from the instrument's error queue without logging them."""
-        try:
-            # Clear error queue by reading until empty
-            while True:
-                error_response = instrument.query("SYST:ERR?").strip()
-                if error_response.startswith("+0,") or error_response.startswith("0,"):
-                    break
-        except Exception:
-            pass  # Ignore if not supported
+        self.ui_channel.post_log(f"[{timestamp}] {message}\n")
+
+    def _poll_ui_channel(self):
+        self._drain_ui_channel()
+        self.root.after(UI_POLL_MS, self._poll_ui_channel)
+
+    def _drain_ui_channel(self):
+        progress, status, lines = self.ui_channel.take()
+        if progress is not None:
+            self.update_progress(*progress)
+        if status is not None:
+            self.status_label.config(text=status)
+        self.live_plot.refresh()
+        if lines:
+            # One insert per frame, then trim the view back to LOG_MAX_LINES
+            self.log_text.config(state="normal")
+            self.log_text.insert("end", "".join(lines))
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.see("end")
+            self.log_text.config(state="disabled")
 
     def scan_resources(self):
-        self.log("Scanning for instruments (this may take a while)...")
+        self.log("Scanning for instruments...")
         # Run scan in a separate thread to not freeze UI if timeouts occur
         threading.Thread(target=self._scan_resources_thread, daemon=True).start()
 
-    def _scan_resources_thread(self):
+    def _scan_resources_thread(self, resources=None):
+        """Probe resources in parallel; resources=None scans everything VISA lists."""
         try:
-            raw_resources = self.rm.list_resources()
-            friendly_list = []
-            
-            for res in raw_resources:
-                try:
-                    with self.rm.open_resource(res) as instr:
-                        instr.timeout = 1000
-                        # Ask for IDN
-                        idn = instr.query("*IDN?").strip()
-                        # Clean up IDN string
-                        # Typical IDN: Manufacturer,Model,Serial,Firmware
-                        parts = idn.split(',')
-                        if len(parts) >= 2:
-                             # Display: "Model (Serial) - ResourceID"
-                             # e.g. "E36313A (MY12345) - USB0::..."
-                            manufacturer = parts[0].strip()
-                            model = parts[1].strip()
-                            friendly_name = f"{manufacturer} {model} - {res}"
-                        else:
-                            friendly_name = f"{idn} - {res}"
-                        friendly_list.append(friendly_name)
-                except Exception:
-                    # If can't open or query, just list the resource ID
-                    friendly_list.append(res)
+            if resources is None:
+                resources = list(self.rm.list_resources())
+                known_only = self.known_only_scan.get()
+            else:
+                known_only = False # Re-verifying cached entries
+
+            results = discovery.discover(self.rm, self.discovery_cache, resources, known_only=known_only)
+            # Resources that can't be opened or queried (or were skipped) are listed by ID
+            friendly_list = [discovery.friendly_name(res, results.get(res)) for res in resources]
 
             # Update UI on main thread
             self.root.after(0, self._update_resource_list, friendly_list)
-            self.root.after(0, self.log, f"Scan complete. Found {len(friendly_list)} instruments.")
+            self.log(f"Scan complete. Found {len(friendly_list)} instruments "
+                     f"({sum(1 for idn in results.values() if idn)} answered *IDN?).")
             
         except Exception as e:
-            self.root.after(0, self.log, f"Error scanning resources: {e}")
+            self.log(f"Error scanning resources: {e}")
             self.root.after(0, messagebox.showerror, "Error", f"Failed to list VISA resources: {e}")
 
     def _update_resource_list(self, resource_list):
         self.psu_combo['values'] = resource_list
         self.dmm_combo['values'] = resource_list
         if resource_list:
-            # Auto-select if we can guess based on model names
+            # Auto-select models that have a driver profile, keeping any existing selection
+            psu_selected = self.psu_address.get() in resource_list
+            dmm_selected = self.dmm_address.get() in resource_list
             for i, name in enumerate(resource_list):
-                # Match general prefixes
-                if "E363" in name:
+                role = drivers.identify(name)
+                if role == "psu" and not psu_selected:
                     self.psu_combo.current(i)
-                if "EDU344" in name:
+                if role == "dmm" and not dmm_selected:
                     self.dmm_combo.current(i)
 
     def browse_file(self):
-        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV Files", "*.csv"), ("NumPy Arrays", "*.npy"), ("Parquet Files", "*.parquet")]
+        )
         if filename:
             self.output_file.set(filename)
 
+    def browse_setpoint_file(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("Setpoint Files", "*.csv *.txt *.npy"), ("All Files", "*.*")]
+        )
+        if filename:
+            self.setpoint_file.set(filename)
+            self.setpoint_spacing.set("From File")
+
     def start_process(self):
         if not self.psu_address.get() or not self.dmm_address.get():
             messagebox.showwarning("Warning", "Please select VISA addresses for both instruments.")
             return
 
-        # Ensure .csv extension
-        output_path = self.output_file.get().strip()
-        if not output_path.lower().endswith(".csv"):
-            output_path += ".csv"
+        try:
+            config = self._build_config()
+            config.validate()
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Invalid Parameters", str(e))
+            return
 
-        if os.path.exists(output_path):
+        # Ensure a supported extension, .csv by default
+        output_path = data_sinks.output_path(config.output_file)
+
+        if os.path.exists(output_path) and config.resumable():
+            answer = messagebox.askyesnocancel(
+                "File Exists",
+                f"The file '{output_path}' already exists.\n\n"
+                "Yes: overwrite it\nNo: resume, measuring only the setpoints not in the file yet"
+            )
+            if answer is None:
+                return
+            config.resume = not answer
+        elif os.path.exists(output_path):
             if not messagebox.askyesno("Overwrite File?", f"The file '{output_path}' already exists.\nDo you want to overwrite it?"):
                 return
 
-        self.is_running = True
-        self.start_btn.config(state="disabled")
-        self.stop_btn.config(state="normal")
-        self.progress_var.set(0)
+        self._set_running()
+        self._reset_plot(config)
         self.log("Starting measurement sequence...")
-        
+
+        self.active_run = sweep_engine.create_run(
+            config, self.rm,
+            log=self.log,
+            on_sample=self._on_sample,
+            on_status=self.ui_channel.set_status,
+            pool=self.session_pool,
+        )
+
         # Start background thread
         self.thread = threading.Thread(target=self.run_sequence)
         self.thread.daemon = True
         self.thread.start()
 
+    def start_batch(self):
+        """Run every job of a batch spec file on the shared sessions, resuming an earlier run of it."""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Batch Spec", "*.json *.yaml *.yml"), ("All Files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            jobs = batch.batch_jobs(sweep_engine.load_spec(filename))
+        except (OSError, ValueError, RuntimeError) as e:
+            messagebox.showerror("Invalid Batch File", str(e))
+            return
+
+        self._set_running()
+        self.log(f"Starting batch of {len(jobs)} runs from {filename}...")
+        self.active_run = batch.BatchRun(
+            jobs, self.rm, batch.default_state_path(filename),
+            log=self.log,
+            on_job=self._on_batch_job,
+            on_sample=self._on_sample,
+            on_status=self.ui_channel.set_status,
+            pool=self.session_pool,
+        )
+        self.thread = threading.Thread(target=self.run_batch_sequence)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _set_running(self):
+        self.is_running = True
+        self.start_btn.config(state="disabled")
+        self.batch_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.progress_var.set(0)
+
+    def _on_batch_job(self, index, count, config):
+        """Called from the batch thread before each job starts."""
+        os.makedirs(os.path.dirname(batch.data_output(config)), exist_ok=True)
+        self._reset_plot(config)
+        self.ui_channel.set_status(f"Batch job {index + 1}/{count}")
+
+    def _reset_plot(self, config):
+        self.reading_unit = data_sinks.READING_TITLES[config.measurement][1]
+        if config.sweep_mode == "continuous":
+            # Measured voltage over time; without a duration the first hour is shown
+            self.log_rate = config.sample_rate
+            self.plot_buffer.reset(0, config.duration or 3600)
+        else:
+            self.log_rate = None
+            self.plot_buffer.reset(*config.voltages().bounds(), sort_x=config.sweep_mode == "adaptive")
+
+    def run_batch_sequence(self):
+        try:
+            done = self.active_run.run()
+            if done == len(self.active_run.jobs):
+                self.root.after(0, messagebox.showinfo, "Batch Complete", f"All {done} runs done.")
+        except Exception as e:
+            self.log(f"Error during batch: {e}")
+            self.root.after(0, messagebox.showerror, "Error", str(e))
+        finally:
+            self.is_running = False
+            self.root.after(0, self.reset_ui_state)
+
     def stop_process(self):
         self.is_running = False
+        if self.active_run:
+            self.active_run.stop()
         self.log("Stop requested. Finishing current step...")
         self.stop_btn.config(state="disabled")
 
@@ -321,166 +616,123 @@ class VisaLoggerApp:
             return selection.split(" - ")[-1].strip()
         return selection.strip()
 
+    def _build_config(self):
+        """Snapshot the GUI fields into a SweepConfig (main thread only)."""
+        nplc_str = self.dmm_nplc.get().strip()
+        return sweep_engine.SweepConfig(
+            psu_address=self._get_resource_from_selection(self.psu_address.get()),
+            dmm_address=self._get_resource_from_selection(self.dmm_address.get()),
+            output_file=self.output_file.get(),
+            start_voltage=self.start_voltage.get(),
+            stop_voltage=self.stop_voltage.get(),
+            step_voltage=self.step_voltage.get(),
+            setpoint_source=SETPOINT_SPACINGS[self.setpoint_spacing.get()],
+            points_per_decade=self.points_per_decade.get(),
+            setpoint_file=self.setpoint_file.get().strip(),
+            current_limit=self.current_limit.get(),
+            settle_time=self.settle_time.get(),
+            # Parse Channel ID from string "1 - Yellow"
+            channel=int(self.psu_channel.get().split(' - ')[0]),
+            high_impedance=self.high_impedance_mode.get(),
+            measurement=MEASUREMENTS[self.measurement.get()],
+            samples_per_point=self.samples_per_point.get(),
+            nplc=float(nplc_str) if nplc_str else None,
+            sweep_mode=SWEEP_MODES[self.sweep_mode.get()],
+            adaptive_tolerance=self.adaptive_tolerance.get(),
+            adaptive_max_points=self.adaptive_max_points.get(),
+            settle_mode="auto" if self.auto_settle.get() else "fixed",
+            settle_tolerance=self.settle_tolerance.get(),
+            sample_rate=self.sample_rate.get(),
+            duration=self.log_duration.get(),
+        )
+
     def run_sequence(self):
-        self.active_psu = None
-        self.active_dmm = None
         try:
-            # Connect Instruments
-            try:
-                psu_addr = self._get_resource_from_selection(self.psu_address.get())
-                dmm_addr = self._get_resource_from_selection(self.dmm_address.get())
-                
-                self.active_psu = self.rm.open_resource(psu_addr)
-                self.active_dmm = self.rm.open_resource(dmm_addr)
-                
-                # Check IDs
-                psu_idn = self.active_psu.query("*IDN?").strip()
-                dmm_idn = self.active_dmm.query("*IDN?").strip()
-                self.root.after(0, self.log, f"Connected to PSU: {psu_idn}")
-                self.root.after(0, self.log, f"Connected to DMM: {dmm_idn}")
-                
-                # Clear any old errors from previous operations
-                self.clear_instrument_errors(self.active_psu, "PSU")
-                self.clear_instrument_errors(self.active_dmm, "DMM")
-                
-            except Exception as e:
-                self.root.after(0, self.log, f"Connection Failed: {e}")
-                raise e
-
-            # Setup measurement parameters
-            start_v = self.start_voltage.get()
-            stop_v = self.stop_voltage.get()
-            step_v = self.step_voltage.get()
-            settle_t = self.settle_time.get()
-            current_lim = self.current_limit.get()
-            
-            # Parse Channel ID from string "1 - Yellow"
-            raw_channel = self.psu_channel.get()
-            channel = int(raw_channel.split(' - ')[0])
-
-            # Generate voltage points
-            # Handle direction (up or down)
-            if start_v <= stop_v:
-                steps = int((stop_v - start_v) / step_v) + 1
-                voltages = [start_v + i * step_v for i in range(steps)]
-            else:
-                steps = int((start_v - stop_v) / step_v) + 1
-                voltages = [start_v - i * step_v for i in range(steps)]
-            
-            total_time = len(voltages) * (settle_t + self.overhead_per_step) 
-            
-            # Configure instruments
-            # PSU Setup (Keysight E36313A)
-            self.active_psu.write(f"INST:NSEL {channel}") # Select Channel
-            self.active_psu.write(f"VOLT {start_v}")
-            self.active_psu.write(f"CURR {current_lim}")
-            
-            # Check for PSU errors
-            if not self.check_instrument_errors(self.active_psu, "PSU"):
-                self.root.after(0, self.log, "⚠️ Aborting due to PSU error")
-                return
-            
-            # DMM Setup (Keysight EDU34450A)
-            # Default is SLOW 5.5 digit mode
-            self.active_dmm.write("CONF:VOLT:DC")
-            
-            # Configure High-Z mode
-            if self.high_impedance_mode.get():
-                self.active_dmm.write("VOLT:IMP:AUTO ON")
-                self.root.after(0, self.log, "High-Z mode enabled (10GΩ for 100mV/1V ranges)")
-            else:
-                self.active_dmm.write("VOLT:IMP:AUTO OFF")
-                self.root.after(0, self.log, "High-Z mode disabled (using standard impedance)")
-            
-            # Check for DMM errors
-            if not self.check_instrument_errors(self.active_dmm, "DMM"):
-                self.root.after(0, self.log, "⚠️ Aborting due to DMM error")
-                return 
-
-            # Create CSV (Ensure extension)
-            file_name = self.output_file.get().strip()
-            if not file_name.lower().endswith(".csv"):
-                file_name += ".csv"
-
-            with open(file_name, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Timestamp", "Set Voltage (V)", "Measured Voltage (V)"])
-
-                # Turn on output
-                self.root.after(0, self.log, f"Enabling Output on Channel {channel}")
-                self.active_psu.write("OUTP ON")
-
-                start_time_process = time.time()
-
-                for idx, v_set in enumerate(voltages):
-                    if not self.is_running:
-                        break
-
-                    # Set Voltage
-                    self.active_psu.write(f"VOLT {v_set}")
-                    
-                    # Check for errors after setting voltage
-                    if not self.check_instrument_errors(self.active_psu, "PSU"):
-                        # Error occurred, stop the sweep
-                        self.root.after(0, self.log, f"⚠️ Stopping due to PSU error at {v_set:.3f}V")
-                        break
-                    
-                    # Settle
-                    self.root.after(0, self.status_label.config, {"text": f"Status: Setting {v_set:.3f}V & Settling..."})
-                    time.sleep(settle_t)
-
-                    # Measure
-                    # READ? configures and measures. MEAS? is higher level.
-                    v_read_str = self.active_dmm.query("READ?")
-                    try:
-                        v_read = float(v_read_str)
-                    except:
-                        v_read = float('nan')
-
-                    writer.writerow([datetime.now().isoformat(), v_set, v_read])
-
-                    # Update UI
-                    elapsed = time.time() - start_time_process
-                    avg_time_per_step = elapsed / (idx + 1)
-                    remaining_steps = len(voltages) - (idx + 1)
-                    time_left = remaining_steps * avg_time_per_step
-                    
-                    percent = ((idx + 1) / len(voltages)) * 100
-                    
-                    # Use lambda to ensure values are passed correctly
-                    self.root.after(0, lambda p=percent, t=time_left, vs=v_set, vr=v_read, e=elapsed: 
-                                      self.update_progress(p, t, vs, vr, e))
-
-            # Calculate final duration
-            total_elapsed = time.time() - start_time_process
-            d_mins, d_secs = divmod(int(total_elapsed), 60)
-            self.root.after(0, self.log, f"Measurement Complete. Total Duration: {d_mins:02d}:{d_secs:02d}")
+            result = self.active_run.run()
+            if result.stats.ok and self.is_running:
+                # Adaptive runs usually finish well under their point bound
+                self.ui_channel.set_progress(100, 0, result.duration)
+            if result.stats.steps_done and not self.log_rate: # Logging time isn't sweep overhead
+                self.root.after(0, self.set_measured_overhead, result.stats.overhead_per_step)
+            problems = [f"{label or 'Measured'}: {a.describe()}"
+                        for label, a in (result.analysis or {}).items() if not a.clean]
+            if problems:
+                # Failed reads are logged as NaN and are easy to miss in the data
+                self.root.after(0, messagebox.showwarning, "Check Measurements", "\n\n".join(problems))
 
         except Exception as e:
-            self.root.after(0, self.log, f"Error during sequence: {e}")
+            self.log(f"Error during sequence: {e}")
             self.root.after(0, messagebox.showerror, "Error", str(e))
 
         finally:
-            # Cleanup
-            if self.active_psu:
-                try:
-                    self.root.after(0, self.log, "Turning off PSU Output...")
-                    self.active_psu.write("OUTP OFF")
-                    self.active_psu.close()
-                except:
-                    pass
-            if self.active_dmm:
-                try:
-                    self.active_dmm.close()
-                except:
-                    pass
-            
-            self.active_psu = None
-            self.active_dmm = None
             self.is_running = False
+            self.last_trace = self.active_run.trace # Kept for failed runs too
             self.root.after(0, self.reset_ui_state)
 
-    def update_progress(self, percent, time_left, v_set, v_read, elapsed):
+    def _on_sample(self, idx, total, v_set, v_read, t_ns, settle_s):
+        """Per-point callback from the sweep thread."""
+        readings = v_read if isinstance(v_read, tuple) else (v_read,) # Multi-channel batch jobs
+        self.plot_buffer.add(idx / self.log_rate if self.log_rate else v_set, readings[0])
+
+        # Update UI
+        elapsed = time.time() - self.active_run.started_at
+        # A resumed run only times the points it measured itself
+        avg_time_per_step = elapsed / (idx + 1 - self.active_run.resumed_from)
+        remaining_steps = max(total - (idx + 1), 0)
+        time_left = remaining_steps * avg_time_per_step
+        
+        percent = ((idx + 1) / total) * 100 if total else 0 # Continuous logging until stopped has no total
+        
+        # Latest value wins, the UI picks it up on its next frame
+        self.ui_channel.set_progress(percent, time_left, elapsed)
+        meas = " ".join(f"{v:.6f}{self.reading_unit}" for v in readings)
+        # Continuous logging reports how late the sample was instead of a settle time
+        timing = "Lag" if self.log_rate else "Settle"
+        self.log(f"Set: {v_set:.3f}V | Meas: {meas} | {timing}: {settle_s * 1000:.1f} ms")
+
+    def show_latency(self):
+        """Per-command p50/p99 table for the last run, with Chrome trace export."""
+        trace = self.last_trace
+        if trace is None:
+            return
+        win = tk.Toplevel(self.root)
+        win.title("VISA Command Latency")
+        win.geometry("560x320")
+
+        columns = ("instr", "command", "count", "p50", "p99", "max", "total")
+        headings = ("Instr", "Command", "Count", "p50 (ms)", "p99 (ms)", "Max (ms)", "Total (s)")
+        tree = ttk.Treeview(win, columns=columns, show="headings", height=10)
+        for col, text in zip(columns, headings):
+            tree.heading(col, text=text)
+            tree.column(col, width=110 if col == "command" else 70, anchor="w" if col in ("instr", "command") else "e")
+        for inst, header, count, p50, p99, max_ns, total in trace.summary():
+            tree.insert("", "end", values=(inst, header, count, f"{p50 / 1e6:.3f}", f"{p99 / 1e6:.3f}",
+                                           f"{max_ns / 1e6:.3f}", f"{total / 1e9:.3f}"))
+        tree.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+        bottom = ttk.Frame(win, padding=(10, 0, 10, 10))
+        bottom.pack(fill="x")
+        note = f"{len(trace.events)} commands traced"
+        if trace.events_dropped:
+            note += f" ({trace.events_dropped} more counted, not kept)"
+        ttk.Label(bottom, text=note).pack(side="left")
+        ttk.Button(bottom, text="Export Trace...", command=lambda: self.export_trace(trace, win)).pack(side="right")
+
+    def export_trace(self, trace, parent=None):
+        filename = filedialog.asksaveasfilename(
+            parent=parent,
+            defaultextension=".json",
+            filetypes=[("Chrome Trace (JSON)", "*.json")]
+        )
+        if not filename:
+            return
+        try:
+            trace.export_chrome_trace(filename)
+            self.log(f"Command trace written to {filename} (open in chrome://tracing or ui.perfetto.dev)")
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write trace: {e}")
+
+    def update_progress(self, percent, time_left, elapsed):
         try:
             self.progress_var.set(percent)
             
@@ -490,14 +742,21 @@ class VisaLoggerApp:
             
             d_mins, d_secs = divmod(int(float(elapsed)), 60)
             self.duration_label.config(text=f"Duration: {d_mins:02d}:{d_secs:02d}")
-            
-            self.log(f"Set: {v_set:.3f}V | Meas: {v_read:.6f}V")
         except Exception as e:
             print(f"UI Update Error: {e}")
 
+    def set_measured_overhead(self, overhead):
+        """Use the overhead measured on the last sweep for future time estimates."""
+        self.overhead_per_step = overhead
+        self.log(f"Measured VISA overhead per step: {overhead * 1000:.1f} ms")
+        self.calculate_estimates()
+
     def reset_ui_state(self):
+        self._drain_ui_channel() # Apply the last worker updates before going idle
         self.start_btn.config(state="normal")
+        self.batch_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
+        self.latency_btn.config(state="normal" if self.last_trace else "disabled")
         self.status_label.config(text="Status: Idle")
 
     def on_closing(self):
@@ -506,23 +765,16 @@ class VisaLoggerApp:
                 self.stop_process()
                 # Give a moment for thread stop signal this blocks main thread, but better than instant kill
                 self._force_cleanup() # Try to force cleanup
+                self.session_pool.close_all()
                 self.root.destroy()
         else:
+            self.session_pool.close_all()
             self.root.destroy()
 
     def _force_cleanup(self):
         # Last attempt to close instruments if app is closing, dont want to leave PSU on
-        if self.active_psu:
-            try:
-                self.active_psu.write("OUTP OFF")
-                self.active_psu.close()
-            except:
-                pass
-        if self.active_dmm:
-            try:
-                self.active_dmm.close()
-            except:
-                pass
+        if self.active_run:
+            self.active_run.force_cleanup()
 
 if __name__ == "__main__":
     root = tk.Tk()
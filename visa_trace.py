@@ -0,0 +1,180 @@
+"""Per-command VISA timing.
+
+TracedSession wraps a pyvisa resource and reports every write/query to a
+CommandTrace: monotonic ns start/end, the command text and the bytes moved.
+The trace keeps a log-bucketed latency histogram per (instrument, SCPI
+header) for p50/p99 figures and the individual events for a Chrome trace
+export (open the JSON in chrome://tracing or https://ui.perfetto.dev).
+
+Recording is a clock read on each side of the call plus a list append, so it
+stays on for every run. Past max_events the histograms keep counting but
+events are no longer stored.
+"""
+import json
+import threading
+import time
+
+# Sub-buckets per power of two in LatencyHistogram, 8 gives ~9% resolution
+_SUB_BITS = 3
+
+
+class LatencyHistogram:
+    """Constant-memory latency histogram with power-of-two buckets split in 8."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    @staticmethod
+    def _bucket(ns):
+        bits = ns.bit_length()
+        if bits <= _SUB_BITS:
+            return ns
+        return ((bits - _SUB_BITS) << _SUB_BITS) | ((ns >> (bits - _SUB_BITS - 1)) & ((1 << _SUB_BITS) - 1))
+
+    @staticmethod
+    def _bucket_upper(bucket):
+        """Largest ns value that falls into bucket."""
+        if bucket < (2 << _SUB_BITS):
+            return bucket
+        shift = (bucket >> _SUB_BITS) - 1
+        return (((1 << _SUB_BITS) | (bucket & ((1 << _SUB_BITS) - 1))) + 1 << shift) - 1
+
+    def add(self, ns):
+        bucket = self._bucket(ns)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q):
+        """Upper bound (ns) of the bucket holding the q-th percentile."""
+        if not self.count:
+            return 0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._bucket_upper(bucket), self.max_ns)
+        return self.max_ns
+
+
+class CommandTrace:
+    """Collects command timings from any number of TracedSessions."""
+
+    def __init__(self, max_events=200000):
+        self.max_events = max_events
+        self.events = [] # (start_ns, end_ns, key, command, bytes_in)
+        self.events_dropped = 0
+        self.histograms = {} # (instrument, header) -> LatencyHistogram
+        self.spans = [] # (start_ns, end_ns, name), e.g. the whole sweep
+        self._lock = threading.Lock()
+
+    def record(self, instrument, command, start_ns, end_ns, bytes_in=0):
+        key = (instrument, command.split(" ", 1)[0])
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = LatencyHistogram()
+            hist.add(end_ns - start_ns)
+            if len(self.events) < self.max_events:
+                self.events.append((start_ns, end_ns, key, command, bytes_in))
+            else:
+                self.events_dropped += 1
+
+    def add_span(self, name, start_ns, end_ns):
+        with self._lock:
+            self.spans.append((start_ns, end_ns, name))
+
+    def summary(self):
+        """[(instrument, header, count, p50_ns, p99_ns, max_ns, total_ns)], most total time first."""
+        with self._lock:
+            rows = [(inst, header, h.count, h.percentile(50), h.percentile(99), h.max_ns, h.total_ns)
+                    for (inst, header), h in self.histograms.items()]
+        return sorted(rows, key=lambda row: row[6], reverse=True)
+
+    def format_summary(self, limit=None):
+        lines = [f"{'Instr':<6}{'Command':<16}{'Count':>8}{'p50 ms':>9}{'p99 ms':>9}{'Total s':>9}"]
+        for inst, header, count, p50, p99, max_ns, total in self.summary()[:limit]:
+            lines.append(f"{inst:<6}{header:<16}{count:>8}{p50 / 1e6:>9.3f}{p99 / 1e6:>9.3f}{total / 1e9:>9.3f}")
+        return lines
+
+    def export_chrome_trace(self, path):
+        """Write the events in Chrome trace event format, one track per instrument."""
+        with self._lock:
+            events, spans = list(self.events), list(self.spans)
+        starts = [e[0] for e in events] + [s[0] for s in spans]
+        origin = min(starts) if starts else 0
+        tids = {}
+        trace = []
+        for start_ns, end_ns, (inst, header), command, bytes_in in events:
+            tid = tids.setdefault(inst, len(tids) + 1)
+            trace.append({
+                "name": header, "cat": "visa", "ph": "X", "pid": 1, "tid": tid,
+                "ts": (start_ns - origin) / 1000, "dur": (end_ns - start_ns) / 1000,
+                "args": {"command": command, "bytes_out": len(command) + 1, "bytes_in": bytes_in},
+            })
+        for start_ns, end_ns, name in spans:
+            trace.append({"name": name, "cat": "run", "ph": "X", "pid": 1, "tid": 0,
+                          "ts": (start_ns - origin) / 1000, "dur": (end_ns - start_ns) / 1000})
+        trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": "Sweep"}})
+        for inst, tid in tids.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": inst}})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms",
+                       "otherData": {"events_dropped": self.events_dropped}}, f)
+
+
+class TracedSession:
+    """Wraps a pyvisa resource, timing write/query/query_binary_values into a CommandTrace.
+
+    Everything else (timeout, close, read_termination, ...) passes straight
+    through to the wrapped session.
+    """
+
+    def __init__(self, session, name, trace):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_trace", trace)
+
+    def __getattr__(self, attr):
+        return getattr(self._session, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._session, attr, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._session.close()
+
+    def write(self, command, *args, **kwargs):
+        start = time.monotonic_ns()
+        try:
+            return self._session.write(command, *args, **kwargs)
+        finally:
+            self._trace.record(self._name, command, start, time.monotonic_ns())
+
+    def query(self, command, *args, **kwargs):
+        start = time.monotonic_ns()
+        response = ""
+        try:
+            response = self._session.query(command, *args, **kwargs)
+            return response
+        finally:
+            self._trace.record(self._name, command, start, time.monotonic_ns(), len(response))
+
+    def query_binary_values(self, command, *args, **kwargs):
+        start = time.monotonic_ns()
+        nbytes = 0
+        try:
+            values = self._session.query_binary_values(command, *args, **kwargs)
+            nbytes = getattr(values, "nbytes", None) or 8 * len(values)
+            return values
+        finally:
+            self._trace.record(self._name, command, start, time.monotonic_ns(), nbytes)